@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import collect_proj
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "collect_proj.py")
+SIZES = [100, 1000, 10000]
+# every n-th crate has no FFI, every m-th crate gets a multi-MB control flow graph
+NO_FFI_EVERY = 5
+BIG_DOT_EVERY = 50
+# sizes of the synthetic tool outputs every stub crate gets
+ENTRY_FILES = 20
+ENTRY_LINES = 200
+CALL_GRAPH_NODES = 300
+CFG_FUNCTIONS = 300
+BIG_CFG_FUNCTIONS = 4000
+CFG_BLOCKS = 12
+INTERFACE_FFIS = 100
+
+# stand-ins for the real tools, each only copies prepared outputs so what remains is our own overhead
+STUB_GIT = """#!/bin/sh
+if [ "$1" = "clone" ]; then
+    for dest; do :; done
+    mkdir -p "$dest/.git"
+    printf '[package]\\nname = "bench"\\nversion = "0.1.0"\\n' > "$dest/Cargo.toml"
+fi
+exit 0
+"""
+STUB_CARGO = """#!/bin/sh
+T={templates}
+case "$1" in
+    fetch) printf 'version = 3\\n\\n[[package]]\\nname = "bench"\\nversion = "0.1.0"\\n' > Cargo.lock;;
+    build) echo "   Compiling bench v0.1.0" >&2;;
+    ffi-checker)
+        mkdir -p target && rm -rf target/entry_points
+        case "$PWD" in
+            *-nf) cp -r "$T/entry_points_noffi" target/entry_points;;
+            *) cp -r "$T/entry_points" target/entry_points;;
+        esac;;
+    ffi-analyzer)
+        cp "$T/call_graph.dot" "$T/interface.json" .
+        case "$PWD" in
+            *-big) cp "$T/big_control_flow_graph.dot" control_flow_graph.dot;;
+            *) cp "$T/control_flow_graph.dot" control_flow_graph.dot;;
+        esac;;
+esac
+exit 0
+"""
+STUB_DOT = """#!/bin/sh
+while [ $# -gt 0 ]; do
+    if [ "$1" = "-o" ]; then echo rendered > "$2"; fi
+    shift
+done
+exit 0
+"""
+STUB_RUSTUP = "#!/bin/sh\nexit 0\n"
+
+def write_cfg(path: str, functions: int, blocks: int, rng: random.Random):
+    # same shape as the ffi-checker output, one subgraph per function and Node<hash>_BB<hash> blocks
+    with open(path, "w") as f:
+        f.write("digraph G {\n    rankdir=LR;\n")
+        for function in range(functions):
+            name = f"Node{rng.getrandbits(64):016x}"
+            f.write(f"    subgraph {name} {{\n        style=filled;\n        color=lightgrey;\n"
+                    f"        label=\"bench::module{function % 17}::<T as core::ops::Fn>::call_{function}\";\n        rankdir=TB;\n")
+            ids = [f"{name}_BB{rng.getrandbits(64):016x}" for _ in range(blocks)]
+            for index, block in enumerate(ids):
+                color = ", color=red" if rng.random() < 0.01 else ""
+                f.write(f"        {block} [label=\"bb{index}\"{color}];\n")
+                if index:
+                    f.write(f"        {ids[rng.randrange(index)]} -> {block};\n")
+            f.write("\n    }\n")
+        f.write("\n}\n")
+
+def write_templates(templates: str, seed: int):
+    rng = random.Random(seed)
+    for name, ffi in [("entry_points", True), ("entry_points_noffi", False)]:
+        directory = os.path.join(templates, name, "bench")
+        os.makedirs(directory, exist_ok=True)
+        for index in range(ENTRY_FILES):
+            with open(os.path.join(directory, f"entry_{index}.txt"), "w") as f:
+                for line in range(ENTRY_LINES):
+                    if ffi and line % 10 == 0:
+                        f.write(f"FFI: ffi_symbol_{rng.randrange(500)} (src/ffi_{index}.rs)\n")
+                    else:
+                        f.write(f"Entry: bench::entry_{index}::fn_{line}\n")
+    with open(os.path.join(templates, "call_graph.dot"), "w") as f:
+        f.write("digraph G {\n    rankdir=LR;\n")
+        names = [f"Node{rng.getrandbits(128):032x}" for _ in range(CALL_GRAPH_NODES)]
+        for index, name in enumerate(names):
+            color = "color=red, " if index % 10 == 0 else ""
+            f.write(f"    {name} [{color}label=\"bench::fn_{index}\"];\n")
+            if index:
+                f.write(f"    {name} -> {names[rng.randrange(index)]};\n")
+        f.write("}\n")
+    write_cfg(os.path.join(templates, "control_flow_graph.dot"), CFG_FUNCTIONS, CFG_BLOCKS, rng)
+    write_cfg(os.path.join(templates, "big_control_flow_graph.dot"), BIG_CFG_FUNCTIONS, CFG_BLOCKS, rng)
+    interface = [
+        {"ffi_name": f"ffi_symbol_{index}",
+         "call_stack": [[f"bench::fn_{rng.randrange(CALL_GRAPH_NODES)}" for _ in range(rng.randrange(8))] for _ in range(rng.randrange(6))]}
+        for index in range(INTERFACE_FFIS)
+    ]
+    with open(os.path.join(templates, "interface.json"), "w") as f:
+        json.dump(interface, f)
+
+def write_stubs(bin_dir: str, templates: str):
+    os.makedirs(bin_dir, exist_ok=True)
+    for name, content in [("git", STUB_GIT), ("cargo", STUB_CARGO.format(templates=templates)),
+                          ("dot", STUB_DOT), ("rustup", STUB_RUSTUP)]:
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        os.chmod(path, 0o755)
+
+def crates_frame(count: int) -> pd.DataFrame:
+    dirnames = []
+    for index in range(count):
+        suffix = "-nf" if index % NO_FFI_EVERY == NO_FFI_EVERY - 1 else "-big" if index % BIG_DOT_EVERY == 0 else ""
+        dirnames.append(f"bench{index:05d}{suffix}")
+    return pd.DataFrame({
+        "name": dirnames,
+        "repository": [f"https://github.com/bench/{dirname}" for dirname in dirnames],
+        "dirname": dirnames,
+        "valid_proj": False,
+        "build_success": False,
+        "ffi_checker_success": False,
+    })
+
+def proc_cpu(pid: int) -> tuple[float, float]:
+    # (own cpu, reaped children cpu) of a running process
+    with open(f"/proc/{pid}/stat", "r") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    return (int(fields[11]) + int(fields[12])) / ticks, (int(fields[13]) + int(fields[14])) / ticks
+
+def bench_pipeline(workdir: str, bin_dir: str, count: int, jobs: int) -> dict:
+    run_dir = os.path.join(workdir, f"run_{count}")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(os.path.join(run_dir, "proj_collect"))
+    os.makedirs(os.path.join(run_dir, "result_collect"))
+    crates_frame(count).to_csv(os.path.join(run_dir, "crates.csv"), index=False)
+    env = dict(os.environ, PATH=bin_dir + os.pathsep + os.environ["PATH"])
+    cmd = [sys.executable, SCRIPT, "build", "--skip", "0", "--limit", str(count), "--jobs", str(jobs), "--mem-reserve", "0"]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=run_dir, env=env)
+    # the last sample before exit tells our own cpu apart from the stubs it reaped
+    samples = [(0.0, 0.0)]
+    def sample():
+        while proc.poll() is None:
+            try:
+                samples.append(proc_cpu(proc.pid))
+            except (OSError, IndexError):
+                break
+            time.sleep(0.1)
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    proc.wait()
+    wall = time.perf_counter() - start
+    sampler.join()
+    own_cpu, tools_cpu = samples[-1]
+    df = pd.read_csv(os.path.join(run_dir, "crates.csv"))
+    result = {
+        "crates": count,
+        "jobs": jobs,
+        "returncode": proc.returncode,
+        "wall_s": wall,
+        "per_crate_ms": wall * 1000 / count,
+        "orchestrator_cpu_s": own_cpu,
+        "tools_cpu_s": tools_cpu,
+        "build_success": int(df["build_success"].sum()),
+        "valid_proj": int(df["valid_proj"].sum()),
+    }
+    shutil.rmtree(run_dir, ignore_errors=True)
+    return result
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def bench_micro(workdir: str, templates: str, count: int, repeat: int) -> dict:
+    # the python side of single pipeline steps, on the same synthetic outputs
+    micro_dir = os.path.join(workdir, "micro")
+    shutil.rmtree(micro_dir, ignore_errors=True)
+    os.makedirs(os.path.join(micro_dir, "proj_collect", "bench", "target"))
+    os.makedirs(os.path.join(micro_dir, "result_collect"))
+    crate_dir = os.path.join(micro_dir, "proj_collect", "bench")
+    shutil.copytree(os.path.join(templates, "entry_points"), os.path.join(crate_dir, "target", "entry_points"))
+    # check_valid stops at the first FFI line, a crate without FFI is the one where it scans every file
+    shutil.copytree(os.path.join(templates, "entry_points_noffi"), os.path.join(micro_dir, "proj_collect", "bench-nf", "target", "entry_points"))
+    for file in ["call_graph.dot", "control_flow_graph.dot", "interface.json"]:
+        shutil.copyfile(os.path.join(templates, file), os.path.join(crate_dir, file))
+    cwd = os.getcwd()
+    os.chdir(micro_dir)
+    try:
+        legacy = pd.DataFrame({
+            "name": [f"bench{index}" for index in range(count)],
+            "normal_build_time": "real_time:1.17s, user_time:1.05s, sys_time:0.39s, maxrss_kb:102400, majflt:0, "
+                                 "inblock:0, oublock:8, nvcsw:120, nivcsw:12",
+        })
+        frame = collect_proj.migrate_time_columns(crates_frame(count))
+        for column in collect_proj.USAGE_COLUMNS:
+            frame[column] = np.random.default_rng(0).random(count) * 100
+        frame["valid_proj"] = True
+        big = os.path.join(templates, "big_control_flow_graph.dot")
+        big_graph = collect_proj.parse_dot(big)
+        conn = collect_proj.db_connect()
+        collect_proj.db_replace_crates(conn, frame)
+        call_graph = collect_proj.parse_dot(os.path.join(templates, "call_graph.dot"))
+        entries = collect_proj.index_ffi_entries("bench")
+        # step -> (seconds per call, items one call handles, item unit)
+        timings = {
+            "check_valid": (best_of(repeat, collect_proj.check_valid, "bench"), 1, "crate"),
+            "check_valid_noffi": (best_of(repeat, collect_proj.check_valid, "bench-nf"), ENTRY_FILES, "file"),
+            "index_ffi_entries": (best_of(repeat, collect_proj.index_ffi_entries, "bench"), len(entries), "entry"),
+            "cp_result": (best_of(repeat, collect_proj.cp_result, "bench"), 3, "file"),
+            "parse_time_str": (best_of(repeat, lambda: [collect_proj.parse_time_str(s) for s in legacy["normal_build_time"]]), count, "row"),
+            "migrate_time_columns": (best_of(repeat, collect_proj.migrate_time_columns, legacy), count, "row"),
+            "parse_dot_call_graph": (best_of(repeat, collect_proj.parse_dot, os.path.join(templates, "call_graph.dot")), len(call_graph.names), "node"),
+            "parse_dot_big_cfg": (best_of(repeat, collect_proj.parse_dot, big), len(big_graph.names), "node"),
+            "reduce_graph_big_cfg": (best_of(repeat, collect_proj.reduce_graph, big_graph, collect_proj.RENDER_MAX_NODES, collect_proj.RENDER_MAX_EDGES), len(big_graph.names), "node"),
+            "db_update_crate": (best_of(repeat, lambda: [collect_proj.db_update_crate(conn, name, {"build_success": True}) for name in frame["name"][:100]]) / 100, 1, "row"),
+            "db_load": (best_of(repeat, collect_proj.db_load, conn), count, "row"),
+            "export_results": (best_of(repeat, collect_proj.export_results, "crates.csv"), count, "row"),
+            "report_metrics": (best_of(repeat, collect_proj.report_metrics, collect_proj.db_load(conn)), count, "row"),
+        }
+        conn.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(micro_dir, ignore_errors=True)
+    return {name: {"seconds": seconds, "items": items, "unit": unit} for name, (seconds, items, unit) in timings.items()}
+
+def bench_config(args: argparse.Namespace) -> dict:
+    # everything the numbers depend on besides the machine, printed and stored to reproduce them
+    return {
+        "stubs": "git/cargo/dot/rustup only copy prepared outputs, no latency is added",
+        "stub_latency_s": 0.0,
+        "jobs": args.jobs,
+        "repeat": args.repeat,
+        "micro_rows": args.micro_rows,
+        "seed": args.seed,
+        "no_ffi_every": NO_FFI_EVERY,
+        "big_dot_every": BIG_DOT_EVERY,
+        "entry_files": ENTRY_FILES,
+        "entry_lines": ENTRY_LINES,
+        "call_graph_nodes": CALL_GRAPH_NODES,
+        "cfg_functions": CFG_FUNCTIONS,
+        "big_cfg_functions": BIG_CFG_FUNCTIONS,
+        "cfg_blocks": CFG_BLOCKS,
+        "interface_ffis": INTERFACE_FFIS,
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(SCRIPT), capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    old_runs = {run["crates"]: run for run in baseline.get("pipeline", [])}
+    for run in report["pipeline"]:
+        old = old_runs.get(run["crates"])
+        if old and run["per_crate_ms"] > old["per_crate_ms"] * (1 + tolerance):
+            regressions.append(f"pipeline {run['crates']} crates: {old['per_crate_ms']:.1f} -> {run['per_crate_ms']:.1f} ms/crate")
+    for name, timing in report["micro"].items():
+        old = baseline.get("micro", {}).get(name)
+        if old and timing["seconds"] > old["seconds"] * (1 + tolerance):
+            regressions.append(f"{name}: {old['seconds'] * 1000:.2f} -> {timing['seconds'] * 1000:.2f} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="bench_orchestration",
+        description="Time collect_proj.py with stubbed git/cargo/dot to measure its own overhead",
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Crate counts of the pipeline runs")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="build --jobs of the pipeline runs")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions of each micro benchmark, the best one counts")
+    parser.add_argument("--micro-rows", type=int, default=10000, help="Rows of the synthetic results for the micro benchmarks")
+    parser.add_argument("--no-pipeline", action="store_true", help="Only run the micro benchmarks")
+    parser.add_argument("--workdir", type=str, default=None, help="Scratch directory, a temporary one by default")
+    parser.add_argument("--output", type=str, default="bench_orchestration.json", help="Machine-readable report")
+    parser.add_argument("--baseline", type=str, default=None, help="Previous report, exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown over the baseline")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic outputs")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="bench_orchestration_"))
+    templates = os.path.join(workdir, "templates")
+    bin_dir = os.path.join(workdir, "bin")
+    write_templates(templates, args.seed)
+    write_stubs(bin_dir, templates)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "config": bench_config(args),
+        "pipeline": [],
+        "micro": bench_micro(workdir, templates, args.micro_rows, args.repeat),
+    }
+    print("config: " + ", ".join(f"{key}={value}" for key, value in report["config"].items()))
+    for name, timing in report["micro"].items():
+        print(f"{name:<24} {timing['seconds'] * 1000:10.2f} ms  {timing['items']:>6} x {timing['unit']:<6}"
+              f"{timing['seconds'] * 1e6 / timing['items']:10.2f} us/{timing['unit']}")
+    if not args.no_pipeline:
+        for count in args.sizes:
+            run = bench_pipeline(workdir, bin_dir, count, args.jobs)
+            report["pipeline"].append(run)
+            print(f"{count:>6} crates: {run['wall_s']:8.2f}s wall, {run['per_crate_ms']:7.1f} ms/crate, "
+                  f"{run['orchestrator_cpu_s']:.2f}s orchestrator cpu, {run['tools_cpu_s']:.2f}s stub cpu")
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.workdir is None:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
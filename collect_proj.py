@@ -1,4 +1,5 @@
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import numpy as np
 import os
@@ -9,7 +10,26 @@ import subprocess
 import resource
 import time
 import re
+import json
+import signal
+import fcntl
+import gzip
+import selectors
+import glob
+import tarfile
+import tomllib
+import hashlib
+import sqlite3
+import threading
+import array
+import math
+import queue
+import contextlib
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from functools import wraps
+from typing import NamedTuple
 
 import logging
 logger = logging.getLogger(__name__)
@@ -17,11 +37,54 @@ logger = logging.getLogger(__name__)
 # https://crates.io/api/v1/crates?category=api-bindings&page=50&per_page=100
 # &sort=recent-downloads
 BASE_URL = "https://crates.io/api/v1"
+# crates.io crawler policy: identify ourselves and stay at or below one request per second
+USER_AGENT = "ffi-checker-eval (https://github.com/deltaLRD/eval)"
+FETCH_RATE = 1.0
+FETCH_WORKERS = 4
+FETCH_RETRIES = 5
+FETCH_BACKOFF = 1.0
+HTTP_CACHE_DIR = ".http_cache"
+HTTP_CACHE_TTL = 60 * 60 * 24
+HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024
 SUB_PROCESS_TIMEOUT = 60 * 30
+# per stage timeout = previous duration * factor, clamped to [floor, SUB_PROCESS_TIMEOUT]
+TIMEOUT_FACTOR = 3.0
+TIMEOUT_FLOOR = 60 * 2
+# assumed cost of a crate when nothing at all has been built yet
+DEFAULT_CRATE_COST = 60 * 5
+# assumed peak memory of a crate never built before
+DEFAULT_PEAK_RSS_KB = 2 * 1024 * 1024
+MEM_RESERVE_MB = 2048
+MEM_SAMPLE_INTERVAL = 1.0
+MEM_POLL_INTERVAL = 2.0
+RESULTS_DB = "results.db"
+GIT_MIRROR_DIR = "git_mirrors"
+SNAPSHOT_DIR = "snapshot"
+FIXTURE_API_PREFIX = "/api/v1"
+VENDOR_STORE_DIR = "vendor_store"
+LOG_DIR = "logs"
+RENDER_FORMAT = "pdf"
+RENDER_CACHE_DIR = "render_cache"
+RENDER_WORKERS = 4
+RENDER_MAX_NODES = 3000
+RENDER_MAX_EDGES = 6000
+METRICS_INTERVAL = 15.0
+METRICS_DISK_INTERVAL = 60 * 5
+# upper bounds in seconds of the stage latency histogram buckets
+STAGE_BUCKETS = [1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600]
+LOG_TAIL_BYTES = 16 * 1024
+CRATES_IO_SOURCE = "registry+https://github.com/rust-lang/crates.io-index"
 RUST_TOOLCHAIN = "nightly-2024-02-08-x86_64-unknown-linux-gnu"
 EXCLUDE_CRATE = {
     "google-api-proto", # This crate is so big that it takes too long to clone and build 
 }
+DIRNAME_LOCKS = {}
+DIRNAME_LOCKS_GUARD = threading.Lock()
+VENDOR_UNPACK = {"bytes": 0, "seconds": 0.0}
+VENDOR_UNPACK_LOCK = threading.Lock()
+# dirname -> current rss of the command group it is running, fed to the admission control
+RUNNING_RSS = {}
+RUNNING_RSS_LOCK = threading.Lock()
 # cargo update serde --precise 1.0.203
 # cargo update zerofrom --precise 0.1.5
 # cargo update litemap --precise 0.7.4
@@ -47,22 +110,674 @@ def time_profiler(func):
         return (result, real_time, user_time, sys_time)
     return wrapper
 
+class ProcUsage(NamedTuple):
+    real_time: float
+    user_time: float
+    sys_time: float
+    maxrss_kb: int
+    peak_rss_kb: int
+    majflt: int
+    inblock: int
+    oublock: int
+    nvcsw: int
+    nivcsw: int
+
+# rusage of the children reaped by run_cmd, collected per thread for the running profiled stage
+_stage_usage = threading.local()
+
+def record_child_usage(ru: resource.struct_rusage, peak_rss_kb: int):
+    children = getattr(_stage_usage, "children", None)
+    if children is not None:
+        children.append((ru, peak_rss_kb))
+
+# crate and stage whose subprocess output run_cmd is capturing on this thread, with the stage's timeout
+_log_context = threading.local()
+
+def set_log_context(dirname: str, stage: str, timeout: float = None):
+    _log_context.dirname = dirname
+    _log_context.stage = stage
+    _log_context.timeout = timeout
+    _log_context.timeouts = []
+
+# cpus and cgroup v2 leaf the measured command started on this thread is confined to
+_isolation = threading.local()
+
+def stage_log_path(dirname: str, stage: str) -> str:
+    return os.path.join(os.getcwd(), LOG_DIR, dirname, f"{stage}.log.gz")
+
+def pump_output(pipes: list, path: str, header: bytes, tail: bytearray):
+    # drains both pipes as soon as data arrives so the child never blocks on a full pipe,
+    # the full output only goes to the compressed file and just the tail stays in memory
+    selector = selectors.DefaultSelector()
+    for pipe in pipes:
+        selector.register(pipe, selectors.EVENT_READ)
+    with gzip.open(path, "ab", compresslevel=1) as out:
+        out.write(header)
+        while selector.get_map():
+            for key, _ in selector.select():
+                data = os.read(key.fd, 65536)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+                out.write(data)
+                tail += data
+                del tail[:-LOG_TAIL_BYTES]
+    selector.close()
+
+# kernels built without CONFIG_PROC_CHILDREN only let us find a group's processes by scanning /proc
+PROC_CHILDREN = os.path.exists(f"/proc/self/task/{os.getpid()}/children")
+
+def group_pids(pgid: int, cgroup: str = None) -> list:
+    # the candidates to check for membership of the group, as few as the kernel lets us name
+    if cgroup is not None:
+        try:
+            with open(os.path.join(cgroup, "cgroup.procs")) as f:
+                pids = [int(pid) for pid in f.read().split()]
+            # the wrapper shell failed to move in, the leaf does not know the group
+            if pgid in pids:
+                return pids
+        except (OSError, ValueError):
+            pass
+    if not PROC_CHILDREN:
+        return [int(pid) for pid in os.listdir("/proc") if pid.isdigit()]
+    # processes orphaned before a sample saw them are reparented away from the tree and missed
+    pids = []
+    frontier = [pgid]
+    while frontier:
+        pid = frontier.pop()
+        pids.append(pid)
+        try:
+            for task in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{task}/children") as f:
+                    frontier.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+def group_usage(pgid: int, cgroup: str = None) -> tuple[float, int]:
+    # cpu seconds and summed rss of every live process in the group,
+    # killed grandchildren never show up in wait4 and ru_maxrss only knows the largest single process
+    total = 0.0
+    rss_kb = 0
+    ticks = os.sysconf("SC_CLK_TCK")
+    page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+    for pid in group_pids(pgid, cgroup):
+        try:
+            with open(f"/proc/{pid}/stat", "r") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # fields[2] is pgrp, fields[11:15] are utime, stime, cutime, cstime, fields[21] is rss in pages
+        if int(fields[2]) == pgid:
+            total += sum(int(value) for value in fields[11:15]) / ticks
+            rss_kb += int(fields[21]) * page_kb
+    return total, rss_kb
+
+def sample_group_rss(pgid: int, cgroup: str, dirname: str, done: threading.Event, peak: list):
+    while not done.wait(MEM_SAMPLE_INTERVAL):
+        rss_kb = group_usage(pgid, cgroup)[1]
+        peak[0] = max(peak[0], rss_kb)
+        if dirname is not None:
+            with RUNNING_RSS_LOCK:
+                RUNNING_RSS[dirname] = rss_kb
+
+# process groups of the commands running on any thread, so the main thread can take them all down on ctrl-c
+LIVE_GROUPS = set()
+LIVE_GROUPS_LOCK = threading.Lock()
+INTERRUPTED = threading.Event()
+
+def kill_live_groups():
+    # no new command starts once this is set, commands already running are killed and raise KeyboardInterrupt
+    INTERRUPTED.set()
+    with LIVE_GROUPS_LOCK:
+        pgids = list(LIVE_GROUPS)
+    for pgid in pgids:
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    return len(pgids)
+
+def kill_group(proc: subprocess.Popen):
+    # cargo leaves rustc, build scripts and linkers behind if only the direct child is killed
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def run_cmd(cmd: list[str], cwd: str = None, timeout: float = None) -> subprocess.CompletedProcess:
+    # like subprocess.run, but reaps the child with wait4 so its own rusage is known exactly
+    if timeout is None:
+        timeout = getattr(_log_context, "timeout", None) or SUB_PROCESS_TIMEOUT
+    if INTERRUPTED.is_set():
+        raise KeyboardInterrupt(f"interrupted before {' '.join(cmd)}")
+    dirname = getattr(_log_context, "dirname", None)
+    pump = None
+    tail = bytearray()
+    cpus = getattr(_isolation, "cpus", None)
+    cgroup = getattr(_isolation, "cgroup", None)
+    spawn_cmd = cmd
+    if cgroup is not None:
+        # the shell moves itself into the leaf before exec, so not even the first fork escapes it
+        # a failed migration only costs the cgroup counters, the command still runs with its affinity
+        spawn_cmd = ["sh", "-c", 'echo 0 2>/dev/null > "$0/cgroup.procs"; exec "$@"', cgroup] + cmd
+    if cpus is not None:
+        # affinity is per thread and inherited by fork, pin this thread only while it spawns
+        thread_cpus = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, cpus)
+    try:
+        # every command leads its own process group so a timeout can take down the whole tree
+        if dirname is None:
+            proc = subprocess.Popen(spawn_cmd, cwd=cwd, process_group=0)
+        else:
+            path = stage_log_path(dirname, _log_context.stage)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            proc = subprocess.Popen(spawn_cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, process_group=0)
+    finally:
+        if cpus is not None:
+            os.sched_setaffinity(0, thread_cpus)
+    with LIVE_GROUPS_LOCK:
+        LIVE_GROUPS.add(proc.pid)
+    # ctrl-c between the check above and the registration would miss this group
+    if INTERRUPTED.is_set():
+        kill_group(proc)
+    if dirname is not None:
+        header = f"$ {' '.join(cmd)}\n".encode()
+        pump = threading.Thread(target=pump_output, args=([proc.stdout, proc.stderr], path, header, tail), daemon=True)
+        pump.start()
+    done = threading.Event()
+    peak = [0]
+    sampler = threading.Thread(target=sample_group_rss, args=(proc.pid, cgroup, dirname, done, peak), daemon=True)
+    sampler.start()
+    expired = threading.Event()
+    killed_cpu = [0.0]
+    def kill():
+        expired.set()
+        killed_cpu[0] = group_usage(proc.pid, cgroup)[0]
+        kill_group(proc)
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+        _, status, ru = os.wait4(proc.pid, 0)
+    except KeyboardInterrupt:
+        # ctrl-c only reaches the foreground group, take the child's group down with us
+        kill_group(proc)
+        raise
+    finally:
+        with LIVE_GROUPS_LOCK:
+            LIVE_GROUPS.discard(proc.pid)
+        timer.cancel()
+        done.set()
+        sampler.join()
+        if dirname is not None:
+            with RUNNING_RSS_LOCK:
+                RUNNING_RSS.pop(dirname, None)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # only the samples count, ru_maxrss carries our own pre-exec rss, so commands shorter than one sample report 0
+    record_child_usage(ru, peak[0])
+    if pump is not None:
+        # grandchildren left in the group still hold the pipes, take them down before waiting for the pump,
+        # a pump still writing would interleave with the next command appending to the same log
+        pump.join(timeout=1)
+        if pump.is_alive():
+            kill_group(proc)
+            pump.join()
+    if INTERRUPTED.is_set():
+        # killed by kill_live_groups, do not let the caller mistake it for a failed build
+        raise KeyboardInterrupt(f"interrupted {' '.join(cmd)}")
+    if expired.is_set():
+        wasted_cpu = max(killed_cpu[0], ru.ru_utime + ru.ru_stime)
+        logging.error(f"{' '.join(cmd)} timed out after {timeout:.0f}s, killed its process group, {wasted_cpu:.1f}s cpu wasted")
+        if hasattr(_log_context, "timeouts"):
+            _log_context.timeouts.append((timeout, wasted_cpu))
+        raise subprocess.TimeoutExpired(cmd, timeout, stderr=bytes(tail))
+    # the error logs print result.stderr, give them the tail of the captured output
+    return subprocess.CompletedProcess(cmd, proc.returncode, stderr=bytes(tail).decode(errors="replace") if pump else None)
+
+def cgroup2_dir() -> str:
+    # our own cgroup on the cgroup v2 mount, None on v1 only hosts
+    mount = None
+    with open("/proc/self/mounts") as f:
+        for line in f:
+            fields = line.split()
+            if fields[2] == "cgroup2":
+                mount = fields[1]
+                break
+    if mount is None:
+        return None
+    with open("/proc/self/cgroup") as f:
+        for line in f:
+            if line.startswith("0::"):
+                return os.path.join(mount, line.strip()[3:].lstrip("/"))
+    return None
+
+def write_cgroup(path: str, file: str, value: str) -> bool:
+    try:
+        with open(os.path.join(path, file), "w") as f:
+            f.write(value)
+        return True
+    except OSError:
+        return False
+
+def create_cgroup_root() -> tuple[str, list]:
+    # (root of the measured leaves, controllers we had to enable in our parent cgroup)
+    parent = cgroup2_dir()
+    if parent is None:
+        logging.warning("No cgroup v2 mount, isolating with cpu affinity only")
+        return None, []
+    root = os.path.join(parent, f"collect_proj-{os.getpid()}")
+    try:
+        os.mkdir(root)
+    except OSError as e:
+        logging.warning(f"Cannot create cgroup {root} ({e}), isolating with cpu affinity only")
+        return None, []
+    # a cgroup handing controllers to its children may not hold processes itself,
+    # so the orchestrator moves out of the parent into a leaf of its own first
+    orchestrator = os.path.join(root, "orchestrator")
+    try:
+        os.mkdir(orchestrator)
+    except OSError as e:
+        logging.warning(f"Cannot create cgroup {orchestrator} ({e}), isolating with cpu affinity only")
+        os.rmdir(root)
+        return None, []
+    if not write_cgroup(orchestrator, "cgroup.procs", "0"):
+        os.rmdir(orchestrator)
+    parent_enabled = []
+    try:
+        with open(os.path.join(parent, "cgroup.controllers")) as f:
+            available = f.read().split()
+        with open(os.path.join(parent, "cgroup.subtree_control")) as f:
+            delegated = f.read().split()
+    except OSError:
+        available, delegated = [], []
+    for controller in CGROUP_CONTROLLERS:
+        if controller in available and controller not in delegated and write_cgroup(parent, "cgroup.subtree_control", f"+{controller}"):
+            parent_enabled.append(controller)
+    # cpu.stat is there either way, the other counters need their controller
+    missing = [controller for controller in CGROUP_CONTROLLERS if not write_cgroup(root, "cgroup.subtree_control", f"+{controller}")]
+    if missing:
+        logging.warning(f"cgroup controllers {', '.join(missing)} unavailable under {root}, their counters are not recorded")
+    logging.info(f"Isolating measured stages in cgroup {root}")
+    return root, parent_enabled
+
+def read_cgroup_stats(path: str, stage: str) -> dict:
+    stats = {}
+    try:
+        with open(os.path.join(path, "cpu.stat")) as f:
+            for line in f:
+                key, value = line.split()
+                if key in CGROUP_CPU_STAT:
+                    stats[f"{stage}_{CGROUP_CPU_STAT[key]}"] = int(value) / 1e6
+    except OSError:
+        pass
+    try:
+        with open(os.path.join(path, "memory.peak")) as f:
+            stats[f"{stage}_cg_memory_peak_kb"] = int(f.read()) / 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        io = dict.fromkeys(CGROUP_IO_STAT, 0)
+        with open(os.path.join(path, "io.stat")) as f:
+            # one line per device: "8:0 rbytes=... wbytes=... rios=..."
+            for line in f:
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key in io:
+                        io[key] += int(value)
+        stats.update({f"{stage}_{suffix}": io[key] for key, suffix in CGROUP_IO_STAT.items()})
+    except OSError:
+        pass
+    return stats
+
+def setup_isolation(args: argparse.Namespace, jobs: int) -> int:
+    # disjoint cpu slices, a measured command borrows one for its whole run
+    cpus = sorted(os.sched_getaffinity(0))
+    per_job = args.cpus_per_job or max(1, len(cpus) // jobs)
+    slices = [set(cpus[start:start + per_job]) for start in range(0, len(cpus) - per_job + 1, per_job)] or [set(cpus)]
+    if len(slices) < jobs:
+        logging.warning(f"Only {len(slices)} cpu slices of {per_job} cpus for {jobs} jobs, measured stages will queue for a slice")
+    args.cpu_slices = queue.Queue()
+    for cpu_slice in slices:
+        args.cpu_slices.put(cpu_slice)
+    args.cgroup_root, args.cgroup_parent_enabled = create_cgroup_root()
+    return len(slices[0])
+
+def teardown_isolation(args: argparse.Namespace):
+    root = getattr(args, "cgroup_root", None)
+    if not root:
+        return
+    args.cgroup_root = None
+    parent = os.path.dirname(root)
+    # undo the controllers in reverse so the orchestrator may go back into the parent
+    for controller in CGROUP_CONTROLLERS:
+        write_cgroup(root, "cgroup.subtree_control", f"-{controller}")
+    for controller in args.cgroup_parent_enabled:
+        write_cgroup(parent, "cgroup.subtree_control", f"-{controller}")
+    orchestrator = os.path.join(root, "orchestrator")
+    try:
+        if os.path.isdir(orchestrator):
+            if not write_cgroup(parent, "cgroup.procs", "0"):
+                logging.warning(f"Cannot move back to cgroup {parent}, {root} is left until this process exits")
+                return
+            os.rmdir(orchestrator)
+        os.rmdir(root)
+    except OSError as e:
+        logging.warning(f"Cannot remove cgroup {root}: {e}")
+
+@contextlib.contextmanager
+def isolated(args: argparse.Namespace, dirname: str, stage: str):
+    # yields the stage's update dict, filled with the cgroup counters once the measured commands are done
+    stats = {}
+    if not getattr(args, "isolate", False):
+        yield stats
+        return
+    cpus = args.cpu_slices.get()
+    cgroup = None
+    if args.cgroup_root:
+        cgroup = os.path.join(args.cgroup_root, f"{dirname}-{stage}-{threading.get_ident()}")
+        try:
+            os.mkdir(cgroup)
+            if os.path.exists(os.path.join(cgroup, "cpuset.cpus")):
+                with open(os.path.join(cgroup, "cpuset.cpus"), "w") as f:
+                    f.write(",".join(str(cpu) for cpu in sorted(cpus)))
+        except OSError as e:
+            logging.warning(f"Cannot set up cgroup {cgroup} ({e}), pinning {dirname} {stage} with cpu affinity only")
+            shutil.rmtree(cgroup, ignore_errors=True)
+            cgroup = None
+    _isolation.cpus = cpus
+    _isolation.cgroup = cgroup
+    stats["isolation"] = "cgroup" if cgroup else "affinity"
+    stats["isolation_cpus"] = ",".join(str(cpu) for cpu in sorted(cpus))
+    try:
+        yield stats
+    finally:
+        _isolation.cpus = None
+        _isolation.cgroup = None
+        if cgroup is not None:
+            cgroup_stats = read_cgroup_stats(cgroup, stage)
+            # no cpu time at all means no command ever made it into the leaf
+            if cgroup_stats.get(f"{stage}_cg_cpu_s"):
+                stats.update(cgroup_stats)
+            else:
+                logging.warning(f"{dirname} {stage} never joined cgroup {cgroup}, recorded as affinity only")
+                stats["isolation"] = "affinity"
+            try:
+                os.rmdir(cgroup)
+            except OSError as e:
+                logging.warning(f"Cannot remove cgroup {cgroup}: {e}")
+        args.cpu_slices.put(cpus)
+
+def log_failure_output(result: subprocess.CompletedProcess):
+    # run_cmd merges stdout and stderr into the stage log, result.stderr only holds its tail
+    dirname = getattr(_log_context, "dirname", None)
+    if dirname is None:
+        logging.error(f"{' '.join(result.args)} exited with {result.returncode}, output went to the console")
+        return
+    logging.error(f"Output tail of {' '.join(result.args)}, full log in {stage_log_path(dirname, _log_context.stage)}: \n{result.stderr}")
+
+def sum_usage(real_time: float, children: list) -> ProcUsage:
+    # linux carries the pre-exec rss into ru_maxrss, so tiny commands report about our own rss
+    return ProcUsage(
+        real_time=real_time,
+        user_time=sum(ru.ru_utime for ru, _ in children),
+        sys_time=sum(ru.ru_stime for ru, _ in children),
+        maxrss_kb=max((ru.ru_maxrss for ru, _ in children), default=0),
+        peak_rss_kb=max((peak for _, peak in children), default=0),
+        majflt=sum(ru.ru_majflt for ru, _ in children),
+        inblock=sum(ru.ru_inblock for ru, _ in children),
+        oublock=sum(ru.ru_oublock for ru, _ in children),
+        nvcsw=sum(ru.ru_nvcsw for ru, _ in children),
+        nivcsw=sum(ru.ru_nivcsw for ru, _ in children),
+    )
+
+def format_usage(usage: ProcUsage) -> str:
+    return (f"real_time:{usage.real_time:.2f}s, user_time:{usage.user_time:.2f}s, sys_time:{usage.sys_time:.2f}s, "
+            f"maxrss_kb:{usage.maxrss_kb}, peak_rss_kb:{usage.peak_rss_kb}, majflt:{usage.majflt}, inblock:{usage.inblock}, oublock:{usage.oublock}, "
+            f"nvcsw:{usage.nvcsw}, nivcsw:{usage.nivcsw}")
+
+# measured stage -> legacy "real_time:1.17s, user_time:..." string column
+TIMED_STAGES = {
+    "normal_build": "normal_build_time",
+    "ffi_checker_build": "ffi_checker_build_time",
+    "ffi_checker_analysis": "ffi_checker_analysis_time",
+}
+# ProcUsage field -> column suffix, e.g. normal_build_real_s
+USAGE_METRICS = {
+    "real_time": "real_s",
+    "user_time": "user_s",
+    "sys_time": "sys_s",
+    "maxrss_kb": "maxrss_kb",
+    "peak_rss_kb": "peak_rss_kb",
+    "majflt": "majflt",
+    "inblock": "inblock",
+    "oublock": "oublock",
+    "nvcsw": "nvcsw",
+    "nivcsw": "nivcsw",
+}
+USAGE_COLUMNS = [f"{stage}_{suffix}" for stage in TIMED_STAGES for suffix in USAGE_METRICS.values()]
+# repeated clean builds with --trials, robust statistics per stage and metric, e.g. normal_build_real_s_median
+TRIAL_STAGES = ["normal_build", "ffi_checker_build"]
+TRIAL_METRICS = ["real_s", "user_s", "sys_s"]
+TRIAL_STATS = ["median", "mad", "ci_low", "ci_high"]
+TRIAL_CONFIDENCE = 0.95
+TRIAL_COLUMNS = ["trials"] + [
+    f"{stage}_{metric}_{stat}" for stage in TRIAL_STAGES for metric in TRIAL_METRICS for stat in TRIAL_STATS
+] + [f"ffi_checker_ratio_{stat}" for stat in TRIAL_STATS]
+CGROUP_CONTROLLERS = ["cpu", "cpuset", "memory", "io"]
+# cgroup v2 counters of a measured stage with --isolate, e.g. normal_build_cg_cpu_s
+CGROUP_CPU_STAT = {"usage_usec": "cg_cpu_s", "user_usec": "cg_user_s", "system_usec": "cg_sys_s", "throttled_usec": "cg_throttled_s"}
+CGROUP_IO_STAT = {"rbytes": "cg_io_rbytes", "wbytes": "cg_io_wbytes"}
+CGROUP_METRICS = list(CGROUP_CPU_STAT.values()) + ["cg_memory_peak_kb"] + list(CGROUP_IO_STAT.values())
+CGROUP_COLUMNS = [f"{stage}_{suffix}" for stage in TIMED_STAGES for suffix in CGROUP_METRICS]
+# graph file -> prefix of its size columns, e.g. cfg_nodes
+GRAPH_FILES = {"call_graph.dot": "call_graph", "control_flow_graph.dot": "cfg"}
+GRAPH_COLUMNS = [f"{prefix}_{suffix}" for prefix in GRAPH_FILES.values() for suffix in ["nodes", "edges", "red_nodes", "clusters", "reduced_nodes", "reduced_edges", "lod", "render_skipped"]]
+CRATES_COLUMNS = [
+    "name", "repository", "dirname",
+    "valid_proj",
+    "build_success",
+    "ffi_checker_success",
+    "listed",
+    "previous_repository",
+    "clone_real_s",
+    "clone_bytes",
+    "submodule_real_s",
+    "submodule_bytes",
+    "vendor_real_s",
+    "vendor_packages",
+    "vendor_reused_packages",
+    "vendor_bytes_added",
+    "vendor_bytes_reused",
+    "vendor_saved_s",
+    "resume_saved_s",
+    "failed_stage",
+    "log_tail",
+    "timeout_stage",
+    "timeout_limit_s",
+    "timeout_cpu_s",
+    "predicted_cost_s",
+    "peak_rss_kb",
+    "ffi_symbols",
+    "render_success",
+    "render_real_s",
+    "render_cached",
+    "isolation",
+    "isolation_cpus",
+] + GRAPH_COLUMNS + USAGE_COLUMNS + TRIAL_COLUMNS + CGROUP_COLUMNS
+REAL_COLUMNS = set(USAGE_COLUMNS) | set(GRAPH_COLUMNS) | set(TRIAL_COLUMNS) | set(CGROUP_COLUMNS) | {
+    "clone_real_s", "clone_bytes", "submodule_real_s", "submodule_bytes",
+    "vendor_real_s", "vendor_packages", "vendor_reused_packages",
+    "vendor_bytes_added", "vendor_bytes_reused", "vendor_saved_s",
+    "resume_saved_s",
+    "timeout_limit_s", "timeout_cpu_s",
+    "predicted_cost_s", "peak_rss_kb", "ffi_symbols",
+    "render_real_s", "render_cached",
+}
+
+def usage_columns(stage: str, usage: ProcUsage) -> dict:
+    return {f"{stage}_{suffix}": float(getattr(usage, field)) for field, suffix in USAGE_METRICS.items()}
+
+def migrate_time_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # one str.extract per metric over the whole column, no per-row parsing
+    df = df.copy()
+    for stage, legacy_column in TIMED_STAGES.items():
+        if legacy_column not in df.columns:
+            continue
+        text = df[legacy_column].astype("string")
+        for field, suffix in USAGE_METRICS.items():
+            column = f"{stage}_{suffix}"
+            values = text.str.extract(rf"{field}:(\d+\.?\d*)", expand=False).astype("float64")
+            if column in df.columns:
+                values = df[column].astype("float64").fillna(values)
+            df[column] = values
+        df.drop(columns=[legacy_column], inplace=True)
+    for column in USAGE_COLUMNS:
+        if column not in df.columns:
+            df[column] = np.nan
+    return df
+
+def migrate(args: argparse.Namespace) -> bool:
+    for path in args.files:
+        if not os.path.exists(path):
+            logging.error(f"Migrate {path} failed, file does not exist")
+            return False
+        df = pd.read_csv(path)
+        if not any(column in df.columns for column in TIMED_STAGES.values()):
+            logging.info(f"{path} already migrated")
+            continue
+        shutil.copyfile(path, path + ".legacy")
+        migrate_time_columns(df).to_csv(path, index=False)
+        logging.info(f"Migrate {path} success, legacy copy saved to {path}.legacy")
+    return True
+
+BOOL_COLUMNS = {"valid_proj", "build_success", "ffi_checker_success", "listed", "render_success"}
+# value of a column for a freshly listed crate, everything else starts empty
+COLUMN_DEFAULTS = {
+    "valid_proj": False,
+    "build_success": False,
+    "ffi_checker_success": False,
+    "listed": True,
+}
+
+def column_type(column: str) -> str:
+    if column in BOOL_COLUMNS:
+        return f"INTEGER DEFAULT {int(COLUMN_DEFAULTS.get(column, False))}"
+    if column in REAL_COLUMNS:
+        return "REAL"
+    return "TEXT"
+
+def sql_value(value):
+    # sqlite3 does not bind numpy scalars, and NaN should be stored as NULL
+    if value is None:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+def db_connect(path: str = RESULTS_DB) -> sqlite3.Connection:
+    # WAL lets every build worker commit its own rows while others read
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS crates (idx INTEGER NOT NULL, name TEXT PRIMARY KEY)")
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(crates)")}
+        for column in CRATES_COLUMNS:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE crates ADD COLUMN "{column}" {column_type(column)}')
+        # one row per distinct FFI symbol an entry point file of a crate records
+        conn.execute("CREATE TABLE IF NOT EXISTS ffi_index ("
+                     "crate TEXT NOT NULL, symbol TEXT NOT NULL, entry_file TEXT NOT NULL, "
+                     "PRIMARY KEY (crate, symbol, entry_file)) WITHOUT ROWID")
+        conn.execute("CREATE INDEX IF NOT EXISTS ffi_index_symbol ON ffi_index (symbol)")
+    return conn
+
+def db_replace_crates(conn: sqlite3.Connection, df: pd.DataFrame):
+    columns = ["idx"] + [column for column in CRATES_COLUMNS if column in df.columns]
+    rows = [
+        [idx] + [sql_value(row[column]) for column in columns[1:]]
+        for idx, row in enumerate(df.to_dict("records"))
+    ]
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    with conn:
+        conn.execute("DELETE FROM crates")
+        conn.executemany(f"INSERT INTO crates ({column_list}) VALUES ({placeholders})", rows)
+
+def db_update_crate(conn: sqlite3.Connection, name: str, fields: dict):
+    if not fields:
+        return
+    assignments = ", ".join(f'"{column}" = ?' for column in fields)
+    values = [sql_value(value) for value in fields.values()]
+    with conn:
+        conn.execute(f"UPDATE crates SET {assignments} WHERE name = ?", values + [name])
+
+def db_load(conn: sqlite3.Connection) -> pd.DataFrame:
+    df = pd.read_sql_query("SELECT * FROM crates ORDER BY idx", conn)
+    df.drop(columns=["idx"], inplace=True)
+    for column in BOOL_COLUMNS:
+        df[column] = df[column].fillna(int(COLUMN_DEFAULTS.get(column, False))).astype(bool)
+    for column in REAL_COLUMNS:
+        df[column] = df[column].astype("float64")
+    return df[CRATES_COLUMNS + [column for column in df.columns if column not in CRATES_COLUMNS]]
+
+def db_replace_ffi_index(conn: sqlite3.Connection, name: str, entries: set):
+    with conn:
+        conn.execute("DELETE FROM ffi_index WHERE crate = ?", (name,))
+        conn.executemany("INSERT INTO ffi_index (crate, symbol, entry_file) VALUES (?, ?, ?)",
+                         [(name, symbol, entry_file) for symbol, entry_file in sorted(entries)])
+
+def load_crates() -> pd.DataFrame:
+    conn = db_connect()
+    try:
+        empty = conn.execute("SELECT COUNT(*) FROM crates").fetchone()[0] == 0
+        if empty and os.path.exists("crates.csv"):
+            logging.info(f"Import crates.csv into {RESULTS_DB}")
+            df = migrate_time_columns(pd.read_csv("crates.csv"))
+            db_replace_crates(conn, df)
+        return db_load(conn)
+    finally:
+        conn.close()
+
+def export_results(path: str) -> bool:
+    conn = db_connect()
+    try:
+        df = db_load(conn)
+    finally:
+        conn.close()
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        # write next to the target and rename, so an interrupted export never leaves a torn file
+        tmp_path = path + ".tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    logging.info(f"Export {len(df)} crates to {path}")
+    return True
+
 def subprocess_time_profiler(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
+        parent_children = getattr(_stage_usage, "children", None)
+        _stage_usage.children = []
         start_real = time.perf_counter()
-        start_ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            end_real = time.perf_counter()
+            children = _stage_usage.children
+            _stage_usage.children = parent_children
+            if parent_children is not None:
+                parent_children.extend(children)
 
-        result = func(*args, **kwargs)
-
-        end_real = time.perf_counter()
-        end_ru = resource.getrusage(resource.RUSAGE_CHILDREN)
-
-        real_time = end_real - start_real
-        user_time = end_ru.ru_utime - start_ru.ru_utime
-        sys_time = end_ru.ru_stime - start_ru.ru_stime
-        logging.info(f"Real time: {real_time:.2f}s, User time: {user_time:.2f}s, Sys time: {sys_time:.2f}s")
-        return (result, real_time, user_time, sys_time)
+        usage = sum_usage(end_real - start_real, children)
+        logging.info(f"{func.__name__}: {format_usage(usage)}")
+        return (result, usage)
     return wrapper
     
 def parse_time_str(s: str) -> list[float]:
@@ -72,44 +787,316 @@ def parse_time_str(s: str) -> list[float]:
     result = [float(num) for num in numbers]
     return result
 
+class RateLimiter:
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        # hand out evenly spaced send slots to all fetch threads
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_time)
+            self.next_time = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class HttpCache:
+    # one json file per url holding the validators and the decoded body, lru by file mtime
+    def __init__(self, path: str = HTTP_CACHE_DIR, ttl: float = HTTP_CACHE_TTL, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def entry_path(self, url: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def get(self, url: str) -> dict:
+        path = self.entry_path(url)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def put(self, url: str, body, etag: str = None, last_modified: str = None):
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+            "body": body,
+        }
+        path = self.entry_path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            stat = os.stat(os.path.join(self.path, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.path, name))
+            total -= size
+            logging.debug(f"Evict {name} from http cache")
+
+class CratesClient:
+    def __init__(self, base_url: str = BASE_URL, workers: int = FETCH_WORKERS, rate: float = FETCH_RATE,
+                 cache: HttpCache = None, offline: bool = False, record_dir: str = None):
+        self.base_url = base_url.rstrip("/")
+        self.record_dir = record_dir
+        self.limiter = RateLimiter(rate)
+        self.cache = cache
+        self.offline = offline
+        self.stats = {"fresh": 0, "revalidated": 0, "downloaded": 0}
+        self.stats_lock = threading.Lock()
+        # one keep-alive pool shared by all fetch threads instead of a new TLS connection per page
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = USER_AGENT
+
+    def count(self, key: str):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def get_json(self, url: str) -> dict:
+        body = self.fetch_json(url)
+        # a snapshot keeps every response so the fixture server can replay the same catalogue
+        if self.record_dir:
+            save_fixture(self.record_dir, url[len(self.base_url):], body)
+        return body
+
+    def fetch_json(self, url: str) -> dict:
+        entry = self.cache.get(url) if self.cache else None
+        if entry is not None and (self.offline or self.cache.is_fresh(entry)):
+            self.count("fresh")
+            return entry["body"]
+        if self.offline:
+            raise requests.HTTPError(f"GET {url} is not in the http cache, cannot run offline")
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        for attempt in range(FETCH_RETRIES + 1):
+            self.limiter.wait()
+            try:
+                response = self.session.get(url, headers=headers, timeout=60)
+            except requests.RequestException as e:
+                error = str(e)
+            else:
+                if response.status_code == 304 and entry is not None:
+                    self.cache.put(url, entry["body"], entry["etag"], entry["last_modified"])
+                    self.count("revalidated")
+                    return entry["body"]
+                if response.status_code == 200:
+                    body = response.json()
+                    if self.cache:
+                        self.cache.put(url, body, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                    self.count("downloaded")
+                    return body
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                error = f"HTTP {response.status_code}"
+            if attempt == FETCH_RETRIES:
+                break
+            backoff = FETCH_BACKOFF * 2 ** attempt
+            logging.warning(f"GET {url} failed ({error}), retry in {backoff:.1f}s")
+            time.sleep(backoff)
+        raise requests.HTTPError(f"GET {url} failed after {FETCH_RETRIES} retries: {error}")
+
 # get the total number of crates in a category
-def get_total_crates(category: str) -> int:
-    url = f"{BASE_URL}/crates?category={category}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        total_crates = data['meta']['total']
-        return total_crates
-    else:
-        print(f"Error: {response.status_code}")
-        return 0
+def get_total_crates(client: CratesClient, category: str) -> int:
+    url = f"{client.base_url}/crates?category={category}&per_page=1"
+    data = client.get_json(url)
+    total_crates = data['meta']['total']
+    return total_crates
 
 @time_profiler
-def get_crates(page: int, per_page: int, category: str) -> list:
-    url = f"{BASE_URL}/crates?category={category}&page={page}&per_page={per_page}&sort=recent-downloads"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        crates = data['crates']
+def get_crates(client: CratesClient, page: int, per_page: int, category: str) -> list:
+    url = f"{client.base_url}/crates?category={category}&page={page}&per_page={per_page}&sort=recent-downloads"
+    data = client.get_json(url)
+    crates = data['crates']
+    return crates
+
+def fetch_all_crates(client: CratesClient, category: str, workers: int) -> list:
+    total_crates = get_total_crates(client, category)
+    logging.info(f"Total crates: {total_crates}")
+    per_page = 100
+    total_pages = total_crates // per_page + 1
+    def fetch_page(page: int) -> list:
+        crates, real_time, *_ = get_crates(client, page, per_page, category)
+        logging.info(f"Page {page}: {len(crates)} crates in {real_time:.2f}s")
         return crates
-    else:
-        print(f"Error: {response.status_code}")
-        return []
-    pass
+
+    start = time.perf_counter()
+    pages = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as pool:
+        # map keeps page order, so the list stays sorted by recent downloads
+        for page, crates in enumerate(pool.map(fetch_page, range(1, total_pages + 1)), 1):
+            print(f"\rPage: {page}/{total_pages}", end="")
+            pages.append(crates)
+    elapsed = time.perf_counter() - start
+    fetched = sum(len(crates) for crates in pages)
+    logging.info(f"\nFetched {total_pages} pages, {fetched} crates in {elapsed:.2f}s "
+                 f"({total_pages / elapsed:.2f} pages/s, {fetched / elapsed:.1f} crates/s)")
+    logging.info(f"Http cache: {client.stats['fresh']} fresh, {client.stats['revalidated']} revalidated (304), "
+                 f"{client.stats['downloaded']} downloaded")
+    if client.cache:
+        client.cache.evict()
+    return pages
+
+def fixture_path(snapshot_dir: str, relative: str) -> str:
+    # one file per request, keyed by the exact path and query the client asked for
+    return os.path.join(snapshot_dir, "api", urllib.parse.quote(relative.lstrip("/"), safe="") + ".json")
+
+def save_fixture(snapshot_dir: str, relative: str, body: dict):
+    path = fixture_path(snapshot_dir, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(body, f, sort_keys=True)
+    os.replace(tmp, path)
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def mirror_path(mirror_dir: str, url: str) -> str:
+    name = url.rstrip("/").split("/")[-1].split(".")[0]
+    return os.path.join(os.getcwd(), mirror_dir, f"{name}-{hashlib.sha256(url.encode()).hexdigest()[:12]}.git")
+
+@subprocess_time_profiler
+def update_mirror(url: str, path: str, partial: bool = False) -> bool:
+    # bare mirror shared by every clone of this url, only new objects are fetched on reruns
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(path):
+                cmd = ["git", "-C", path, "remote", "update", "--prune"]
+            else:
+                cmd = ["git", "clone", "--mirror"]
+                if partial:
+                    cmd.append("--filter=blob:none")
+                cmd += [url, path]
+            result = run_cmd(cmd)
+            if result.returncode == 0:
+                logging.info(f"Mirror {url} success")
+                return True
+            else:
+                logging.error(f"Mirror {url} failed")
+                if not os.path.exists(os.path.join(path, "HEAD")):
+                    shutil.rmtree(path, ignore_errors=True)
+                return False
+        except subprocess.TimeoutExpired:
+            logging.error(f"Mirror {url} timeout")
+            return False
+        except Exception as e:
+            logging.error(f"Mirror {url} failed: {e}")
+            return False
+
+def fixture_repo_path(snapshot_dir: str, url: str) -> str:
+    # https://github.com/a/b is served as /git/github.com/a/b, one insteadOf rule covers every host
+    parts = urllib.parse.urlsplit(url.rstrip("/"))
+    return os.path.join(os.path.abspath(snapshot_dir), "git", parts.netloc, parts.path.strip("/"))
+
+def snapshot_repo(url: str, snapshot_dir: str) -> bool:
+    path = fixture_repo_path(snapshot_dir, url)
+    ret, _ = update_mirror(url, path)
+    if not ret:
+        return False
+    # the fixture server is a plain file server, git clones it with the dumb http protocol
+    return run_cmd(["git", "-C", path, "update-server-info"]).returncode == 0
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    snapshot_dir = SNAPSHOT_DIR
+    protocol_version = "HTTP/1.1"
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def not_found(self):
+        self.send_body(404, b'{"errors":[{"detail":"Not Found"}]}', "application/json")
+
+    def do_GET(self):
+        if self.path.startswith(FIXTURE_API_PREFIX + "/"):
+            path = fixture_path(self.snapshot_dir, self.path[len(FIXTURE_API_PREFIX):])
+            if not os.path.isfile(path):
+                logging.error(f"Fixture server: no recorded response for {self.path}")
+                return self.not_found()
+            with open(path, "rb") as f:
+                body = f.read()
+            etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self.send_body(304, b"", "application/json", {"ETag": etag})
+            return self.send_body(200, body, "application/json", {"ETag": etag})
+        if self.path.startswith("/git/"):
+            root = os.path.realpath(os.path.join(self.snapshot_dir, "git"))
+            relative = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path[len("/git/"):])
+            path = os.path.realpath(os.path.join(root, relative))
+            if not path.startswith(root + os.sep) or not os.path.isfile(path):
+                return self.not_found()
+            with open(path, "rb") as f:
+                return self.send_body(200, f.read(), "application/octet-stream")
+        return self.not_found()
+
+    do_HEAD = do_GET
+
+    def log_message(self, format, *args):
+        logging.debug(f"Fixture server: {format % args}")
 
 @subprocess_time_profiler
-def clone_crate(url: str, dirname: str) -> bool:
+def clone_crate(url: str, dirname: str, reference: str = None, shallow: bool = False, partial: bool = False) -> bool:
     cwd = os.path.join(os.getcwd(), "proj_collect")
     logging.debug(f"\nClone {url} to {cwd}")
+    cmd = ["git", "clone"]
+    if reference:
+        # objects are borrowed from the mirror through alternates instead of being downloaded again
+        cmd += ["--reference-if-able", reference]
+    if shallow:
+        cmd += ["--depth", "1"]
+    if partial:
+        cmd.append("--filter=blob:none")
     try:
-        result = subprocess.run(["git", "clone", url, dirname], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
+        result = run_cmd(cmd + [url, dirname], cwd=cwd)
         if result.returncode == 0:
             logging.info(f"Clone {url} success")
             return True
         else:
             logging.error(f"Clone {url} failed")
-            logging.error(f"Error stderr: \n{result.stderr}")
-            logging.error(f"Error stdout: \n{result.stdout}")
+            log_failure_output(result)
             return False
     except subprocess.TimeoutExpired:
         logging.error(f"Clone {url} timeout")
@@ -119,18 +1106,20 @@ def clone_crate(url: str, dirname: str) -> bool:
         return False
 
 @subprocess_time_profiler
-def init_submodule(dirname: str) -> bool:
+def init_submodule(dirname: str, shallow: bool = False) -> bool:
     cwd = os.path.join(os.getcwd(), "proj_collect", dirname)
     logging.debug(f"\nInit submodule in {cwd}")
+    cmd = ["git", "submodule", "update", "--init", "--recursive"]
+    if shallow:
+        cmd += ["--depth", "1"]
     try:
-        result = subprocess.run(["git", "submodule", "update", "--init", "--recursive"], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
+        result = run_cmd(cmd, cwd=cwd)
         if result.returncode == 0:
             logging.info(f"Init submodule in {cwd} success")
             return True
         else:
             logging.error(f"Init submodule in {cwd} failed")
-            logging.error(f"Error stderr: \n{result.stderr}")
-            logging.error(f"Error stdout: \n{result.stdout}")
+            log_failure_output(result)
             return False
     except subprocess.TimeoutExpired:
         logging.error(f"{dirname} timeout")
@@ -139,22 +1128,22 @@ def init_submodule(dirname: str) -> bool:
         logging.error(f"failed: {e}")
         return False
 
-def override_toolchain(dirname: str) -> bool:
+def override_toolchain(dirname: str, vendor: bool = True) -> bool:
     cwd = os.path.join(os.getcwd(), "proj_collect", dirname)
     try:
-        result = subprocess.run(["rustup", "override", "set", RUST_TOOLCHAIN], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
-        subprocess.run(["cargo", "update", "serde", "--precise", "1.0.203"], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
-        subprocess.run(["cargo", "update", "native-tls", "--precise", "0.2.13"], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
-        subprocess.run(["cargo", "update", "zerofrom", "--precise", "0.1.5"], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
-        subprocess.run(["cargo", "update", "litemap", "--precise", "0.7.4"], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
-        subprocess.run(["cargo", "vendor"], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
+        result = run_cmd(["rustup", "override", "set", RUST_TOOLCHAIN], cwd=cwd)
+        run_cmd(["cargo", "update", "serde", "--precise", "1.0.203"], cwd=cwd)
+        run_cmd(["cargo", "update", "native-tls", "--precise", "0.2.13"], cwd=cwd)
+        run_cmd(["cargo", "update", "zerofrom", "--precise", "0.1.5"], cwd=cwd)
+        run_cmd(["cargo", "update", "litemap", "--precise", "0.7.4"], cwd=cwd)
+        if vendor:
+            run_cmd(["cargo", "vendor"], cwd=cwd)
         if result.returncode == 0:
             logging.info(f"Override toolchain in {cwd} success")
             return True
         else:
             logging.error(f"Override toolchain in {cwd} failed")
-            logging.error(f"Error stderr: \n{result.stderr}")
-            logging.error(f"Error stdout: \n{result.stdout}")
+            log_failure_output(result)
             return False
     except subprocess.TimeoutExpired:
         logging.error(f"{dirname} timeout")
@@ -164,17 +1153,121 @@ def override_toolchain(dirname: str) -> bool:
         return False
     pass
 
+def registry_crate_file(name: str, version: str) -> str:
+    cargo_home = os.environ.get("CARGO_HOME", os.path.expanduser("~/.cargo"))
+    found = glob.glob(os.path.join(cargo_home, "registry", "cache", "*", f"{name}-{version}.crate"))
+    return found[0] if found else None
+
+def store_package(store: str, name: str, version: str, checksum: str) -> tuple[str, int, bool]:
+    # unpack the .crate once per (name, version, checksum), every later crate only links to it
+    key = f"{name}-{version}-{checksum[:16]}"
+    path = os.path.join(store, key)
+    size_path = path + ".size"
+    if os.path.exists(size_path):
+        with open(size_path, "r") as f:
+            return path, int(f.read()), True
+    crate_file = registry_crate_file(name, version)
+    if crate_file is None:
+        raise FileNotFoundError(f"{name}-{version}.crate is not in the cargo registry cache")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    size = 0
+    with tarfile.open(crate_file, "r:gz") as tar:
+        prefix = f"{name}-{version}/"
+        members = [member for member in tar.getmembers() if member.name.startswith(prefix)]
+        for member in members:
+            member.name = member.name[len(prefix):]
+            size += member.size
+        tar.extractall(tmp_path, members=[member for member in members if member.name], filter="data")
+    with open(os.path.join(tmp_path, ".cargo-checksum.json"), "w") as f:
+        json.dump({"files": {}, "package": checksum}, f)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # another job stored the same package first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    with open(size_path + ".tmp" + str(threading.get_ident()), "w") as f:
+        f.write(str(size))
+    os.replace(size_path + ".tmp" + str(threading.get_ident()), size_path)
+    return path, size, False
+
+def vendor_crate(dirname: str, store: str) -> dict:
+    # replaces the per-crate `cargo vendor` with links into one content-addressed store
+    cwd = os.path.join(os.getcwd(), "proj_collect", dirname)
+    start = time.perf_counter()
+    result = run_cmd(["cargo", "fetch"], cwd=cwd)
+    if result.returncode != 0:
+        logging.error(f"Fetch deps of {dirname} failed")
+        return None
+    with open(os.path.join(cwd, "Cargo.lock"), "rb") as f:
+        packages = tomllib.load(f).get("package", [])
+    packages = [package for package in packages if package.get("source") == CRATES_IO_SOURCE]
+    if any("checksum" not in package for package in packages):
+        logging.info(f"{dirname} has an old Cargo.lock without checksums, vendor store skipped")
+        return None
+    cargo_dir = os.path.join(cwd, ".cargo")
+    config_path = os.path.join(cargo_dir, "config")
+    if not os.path.exists(config_path):
+        config_path = os.path.join(cargo_dir, "config.toml")
+    configured = False
+    if os.path.exists(config_path):
+        with open(config_path, "r") as f:
+            config = f.read()
+        configured = "[source.eval-vendor-store]" in config
+        if "[source." in config and not configured:
+            logging.info(f"{dirname} configures its own sources, vendor store skipped")
+            return None
+
+    store = os.path.abspath(store)
+    os.makedirs(store, exist_ok=True)
+    links_dir = os.path.join(cargo_dir, "vendor")
+    # an existing replace-with must never see a half-filled links dir, fill a temporary one and swap it in
+    tmp_links_dir = links_dir + ".tmp"
+    shutil.rmtree(tmp_links_dir, ignore_errors=True)
+    os.makedirs(tmp_links_dir)
+    stats = {"vendor_packages": len(packages), "vendor_reused_packages": 0, "vendor_bytes_added": 0, "vendor_bytes_reused": 0}
+    unpack_time = 0.0
+    try:
+        for package in packages:
+            unpack_start = time.perf_counter()
+            path, size, reused = store_package(store, package["name"], package["version"], package["checksum"])
+            if reused:
+                stats["vendor_reused_packages"] += 1
+                stats["vendor_bytes_reused"] += size
+            else:
+                unpack_time += time.perf_counter() - unpack_start
+                stats["vendor_bytes_added"] += size
+            os.symlink(path, os.path.join(tmp_links_dir, f"{package['name']}-{package['version']}"))
+    except BaseException:
+        shutil.rmtree(tmp_links_dir, ignore_errors=True)
+        raise
+    shutil.rmtree(links_dir, ignore_errors=True)
+    os.rename(tmp_links_dir, links_dir)
+    # the source block goes in only once every link exists
+    if not configured:
+        with open(config_path, "a") as f:
+            f.write("\n[source.crates-io]\nreplace-with = \"eval-vendor-store\"\n\n"
+                    f"[source.eval-vendor-store]\ndirectory = \"{links_dir}\"\n")
+    stats["vendor_real_s"] = time.perf_counter() - start
+    # what unpacking the reused packages would have cost at the unpack throughput seen so far in this run
+    with VENDOR_UNPACK_LOCK:
+        VENDOR_UNPACK["bytes"] += stats["vendor_bytes_added"]
+        VENDOR_UNPACK["seconds"] += unpack_time
+        throughput = VENDOR_UNPACK["bytes"] / VENDOR_UNPACK["seconds"] if VENDOR_UNPACK["seconds"] > 0 else 0
+    stats["vendor_saved_s"] = stats["vendor_bytes_reused"] / throughput if throughput > 0 else 0.0
+    logging.info(f"Vendor {dirname}: {stats['vendor_reused_packages']}/{stats['vendor_packages']} packages reused, "
+                 f"{stats['vendor_bytes_reused'] / 1e6:.1f}MB and ~{stats['vendor_saved_s']:.2f}s saved")
+    return stats
+
 def cargo_clean(dirname: str) -> bool:
     cwd = os.path.join(os.getcwd(), "proj_collect", dirname)
     logging.debug(f"\nClean {dirname} in {cwd}")
-    result = subprocess.run(["cargo", "clean"], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
+    result = run_cmd(["cargo", "clean"], cwd=cwd)
     if result.returncode == 0:
         logging.info(f"Clean {dirname} success")
         return True
     else:
         logging.error(f"Clean {dirname} failed")
-        logging.error(f"Error stderr: \n{result.stderr}")
-        logging.error(f"Error stdout: \n{result.stdout}")
+        log_failure_output(result)
         return False
     pass
 
@@ -183,14 +1276,13 @@ def build_crate(dirname: str) -> bool:
     cwd = os.path.join(os.getcwd(), "proj_collect", dirname)
     logging.info(f"\nBuild {dirname} in {cwd}")
     try:
-        result = subprocess.run(["cargo", "build", "-Zcheck-cfg"], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
+        result = run_cmd(["cargo", "build", "-Zcheck-cfg"], cwd=cwd)
         if result.returncode == 0:
             logging.info(f"Build {dirname} success")
             return True
         else:
             logging.error(f"Build {dirname} failed")
-            logging.error(f"Error stderr: \n{result.stderr}")
-            logging.error(f"Error stdout: \n{result.stdout}")
+            log_failure_output(result)
             return False
     except subprocess.TimeoutExpired:
         logging.error(f"{dirname} timeout")
@@ -205,14 +1297,13 @@ def gen_crate_ir(dirname: str) -> bool:
     cwd = os.path.join(os.getcwd(), "proj_collect", dirname)
     logging.info(f"Gen IR {dirname} in {cwd}")
     try:
-        result = subprocess.run(["cargo", "ffi-checker"], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
+        result = run_cmd(["cargo", "ffi-checker"], cwd=cwd)
         if result.returncode == 0:
             logging.info(f"Gen IR {dirname} success")
             return True
         else:
             logging.error(f"Gen IR {dirname} failed")
-            logging.error(f"Error stderr: \n{result.stderr}")
-            logging.error(f"Error stdout: \n{result.stdout}")
+            log_failure_output(result)
             return False
     except subprocess.TimeoutExpired:
         logging.error(f"{dirname} timeout")
@@ -221,37 +1312,36 @@ def gen_crate_ir(dirname: str) -> bool:
         logging.error(f"failed: {e}")
         return False
 
-def check_valid(dirname: str) -> bool:
+def iter_ffi_entries(dirname: str):
+    # lazily yields (symbol, entry file) one line at a time, a caller that stops early reads no further
     cwd = os.path.join(os.getcwd(), "proj_collect", dirname, "target", "entry_points")
-    crate_ffi_record_files = []
-    for root,dirs,files in os.walk(cwd, topdown=False):
+    for root, dirs, files in os.walk(cwd):
         for name in files:
-            crate_ffi_record_files.append(os.path.join(root, name))
-    ffi_cnt = 0
-    for file in crate_ffi_record_files:
-        with open(file, "r") as f:
-            lines = f.readlines()
-            for line in lines:
-                if line.startswith("FFI: "):
-                    ffi_cnt += 1
-    if ffi_cnt <= 0:
-        return False
-    else:
-        return True
+            path = os.path.join(root, name)
+            with open(path, "r", errors="replace") as f:
+                for line in f:
+                    if line.startswith("FFI: "):
+                        symbol = line[5:].split(maxsplit=1)
+                        yield (symbol[0] if symbol else "", os.path.relpath(path, cwd))
+
+def check_valid(dirname: str) -> bool:
+    return any(True for _ in iter_ffi_entries(dirname))
+
+def index_ffi_entries(dirname: str) -> set:
+    return set(iter_ffi_entries(dirname))
 
 @subprocess_time_profiler
 def analyze_crate(dirname: str) -> bool:
     cwd = os.path.join(os.getcwd(), "proj_collect", dirname)
     logging.info(f"Analyze {dirname} in {cwd}")
     try:
-        result = subprocess.run(["cargo", "ffi-analyzer"], cwd=cwd, timeout=SUB_PROCESS_TIMEOUT)
+        result = run_cmd(["cargo", "ffi-analyzer"], cwd=cwd)
         if result.returncode == 0:
             logging.info(f"Analyze {dirname} success")
             return True
         else:
             logging.error(f"Analyze {dirname} failed")
-            logging.error(f"Error stderr: \n{result.stderr}")
-            logging.error(f"Error stdout: \n{result.stdout}")
+            log_failure_output(result)
             return False
     except subprocess.TimeoutExpired:
         logging.error(f"{dirname} timeout")
@@ -271,201 +1361,1596 @@ def cp_result(dirname: str):
     shutil.copyfile(os.path.join(cwd, "interface.json"), os.path.join(dest_dir, "interface.json"))
     pass
 
-@subprocess_time_profiler
-def render_graph(dirname: str) -> bool:
-    dest_dir = os.path.join(os.getcwd(), "result_collect", dirname)
-    call_graph = os.path.join(dest_dir, "call_graph.dot")
-    control_flow_graph = os.path.join(dest_dir, "control_flow_graph.dot")
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def render_file(src: str, out: str, fmt: str, cache_dir: str, force: bool = False) -> tuple[bool, bool]:
+    # renders are cached by the sha of the dot source and the format, an unchanged graph is never rendered twice
+    cached = os.path.join(os.getcwd(), cache_dir, f"{file_sha256(src)}.{fmt}")
+    hit = os.path.exists(cached) and not force
+    if not hit:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        tmp_path = f"{cached}.{threading.get_ident()}.tmp"
+        result = run_cmd(["dot", f"-T{fmt}", src, "-o", tmp_path])
+        if result.returncode != 0 or not os.path.exists(tmp_path):
+            logging.error(f"Render {src} failed")
+            log_failure_output(result)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False, False
+        os.replace(tmp_path, cached)
+    if os.path.exists(out):
+        os.remove(out)
     try:
-        if os.path.exists(call_graph):
-            # 4000000
-            if os.path.getsize(call_graph) > 4000000:
-                logging.error(f"Call graph {call_graph} is too large")
-                return False
-            result = subprocess.run(["dot", "-Tpdf", call_graph, "-o", os.path.join(dest_dir, "call_graph.pdf")], timeout=SUB_PROCESS_TIMEOUT)
-            if result.returncode == 0:
-                logging.info(f"Render {call_graph} success")
-            else:
-                logging.error(f"Render {call_graph} failed")
-                logging.error(f"Error stderr: \n{result.stderr}")
-                logging.error(f"Error stdout: \n{result.stdout}")
-                return False
-        if os.path.exists(control_flow_graph):
-            if os.path.getsize(control_flow_graph) > 3000000:
-                logging.error(f"Call graph {call_graph} is too large")
-                return False
-            result = subprocess.run(["dot", "-Tpdf", control_flow_graph, "-o", os.path.join(dest_dir, "control_flow_graph.pdf")], timeout=SUB_PROCESS_TIMEOUT)
-            if result.returncode == 0:
-                logging.info(f"Render {control_flow_graph} success")
+        os.link(cached, out)
+    except OSError:
+        shutil.copyfile(cached, out)
+    return True, hit
+
+def render_output(dest_dir: str, file: str, fmt: str) -> str:
+    return os.path.join(dest_dir, f"{file[:-len('.dot')]}.{fmt}")
+
+def render_graph(dirname: str, fmt: str = RENDER_FORMAT, cache_dir: str = RENDER_CACHE_DIR, force: bool = False) -> dict:
+    dest_dir = os.path.join(os.getcwd(), "result_collect", dirname)
+    stats = {"render_real_s": 0.0, "render_cached": 0}
+    success = True
+    for file in GRAPH_FILES:
+        src = os.path.join(dest_dir, file)
+        if os.path.exists(skipped_path(src)):
+            logging.info(f"Render {src} skipped, still over the render budget at the coarsest level")
+            continue
+        # graphs over the render budget were reduced first, render what the reduce stage left
+        if os.path.exists(lod_path(src)):
+            src = lod_path(src)
+        if not os.path.exists(src):
+            continue
+        out = render_output(dest_dir, file, fmt)
+        start = time.perf_counter()
+        try:
+            ret, hit = render_file(src, out, fmt, cache_dir, force)
+        except subprocess.TimeoutExpired:
+            logging.error(f"Render {src} timeout")
+            ret, hit = False, False
+        except Exception as e:
+            logging.error(f"Render {src} failed: {e}")
+            ret, hit = False, False
+        elapsed = time.perf_counter() - start
+        stats["render_real_s"] += elapsed
+        stats["render_cached"] += int(hit)
+        success = success and ret
+        if ret:
+            logging.info(f"Render {src} {'cached' if hit else 'success'} in {elapsed:.2f}s")
+    stats["render_success"] = success
+    return stats
+
+DOT_ID = r'"(?:[^"\\]|\\.)*"|[\w.]+'
+DOT_SUBGRAPH_RE = re.compile(rf'\s*subgraph\s*({DOT_ID})?\s*\{{\s*$')
+DOT_EDGE_RE = re.compile(rf'\s*((?:{DOT_ID})(?:\s*->\s*(?:{DOT_ID}))+)\s*(?:\[(.*)\])?\s*;?\s*$', re.S)
+DOT_NODE_RE = re.compile(rf'\s*({DOT_ID})\s*(?:\[(.*)\])?\s*;?\s*$', re.S)
+DOT_ATTR_STMT_RE = re.compile(rf'\s*(\w+)\s*=\s*({DOT_ID})\s*;?\s*$', re.S)
+DOT_ATTR_RE = re.compile(rf'(\w+)\s*=\s*({DOT_ID}|[^,;\]\s]+)')
+DOT_ID_RE = re.compile(DOT_ID)
+DOT_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[{};]|[^"{};]+')
+DOT_KEYWORDS = {"graph", "node", "edge"}
+
+def dot_unquote(value: str) -> str:
+    if value.startswith('"'):
+        return value[1:-1].replace('\\"', '"')
+    return value
+
+class DotGraph:
+    # nodes are 0..n-1, out edges of node i are indices[indptr[i]:indptr[i+1]] (CSR),
+    # labels are interned so the thousands of "bb1"/"Return" blocks share one string
+    def __init__(self, names: list, label_table: list, labels: np.ndarray, red: np.ndarray,
+                 cluster: np.ndarray, cluster_names: list, cluster_labels: np.ndarray,
+                 indptr: np.ndarray, indices: np.ndarray):
+        self.names = names
+        self.label_table = label_table
+        self.labels = labels
+        self.red = red
+        self.cluster = cluster
+        self.cluster_names = cluster_names
+        self.cluster_labels = cluster_labels
+        self.indptr = indptr
+        self.indices = indices
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.names)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    def label(self, node: int) -> str:
+        # -1 for nodes without a label, dot shows their name
+        index = self.labels[node]
+        return self.label_table[index] if index >= 0 else self.names[node]
+
+    def successors(self, node: int) -> np.ndarray:
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def edges(self) -> tuple[np.ndarray, np.ndarray]:
+        src = np.repeat(np.arange(self.n_nodes, dtype=np.int32), np.diff(self.indptr))
+        return src, self.indices
+
+    def reverse(self) -> tuple[np.ndarray, np.ndarray]:
+        # CSR of the incoming edges
+        src, dst = self.edges()
+        return csr_from_edges(dst, src, self.n_nodes)
+
+def csr_from_edges(src: np.ndarray, dst: np.ndarray, n_nodes: int) -> tuple[np.ndarray, np.ndarray]:
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_nodes), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32)
+
+def split_dot_statements(text: str):
+    # several statements or braces on one line, quoted strings are kept whole
+    statement = ""
+    for token in DOT_TOKEN_RE.findall(text):
+        if token == ";" or token == "{":
+            yield (statement + token).strip()
+            statement = ""
+        elif token == "}":
+            if statement.strip():
+                yield statement.strip()
+            yield "}"
+            statement = ""
+        else:
+            statement += token
+    if statement.strip():
+        yield statement.strip()
+
+def iter_dot_statements(path: str):
+    # one statement at a time, quoted labels may run over several lines
+    pending = ""
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            pending += line
+            if '"' in line and (pending.count('"') - pending.count('\\"')) % 2:
+                continue
+            # the generated files put one statement on each line, only split when that is not the case
+            statement = pending.strip()
+            body = statement[:-1]
+            if ";" in body or "{" in body or "}" in body:
+                yield from split_dot_statements(statement)
             else:
-                logging.error(f"Render {control_flow_graph} failed")
-                logging.error(f"Error stderr: \n{result.stderr}")
-                logging.error(f"Error stdout: \n{result.stdout}")
-                return False
-    except subprocess.TimeoutExpired:
-        logging.error(f"{dirname} timeout")
-        return False
-    except Exception as e:
-        logging.error(f"failed: {e}")
-        return False
+                yield statement
+            pending = ""
+    if pending.strip():
+        yield from split_dot_statements(pending)
 
-def init():
-    os.mkdir("proj_collect")
-    os.mkdir("result_collect")
-    logging.info("Create directories: proj_collect, result_collect")
-    df = pd.DataFrame(columns=[
-        "name", "repository", "dirname", 
-        "valid_proj",
-        "build_success", 
-        "normal_build_time", 
-        "ffi_checker_success",
-        "ffi_checker_build_time", 
-        "ffi_checker_analysis_time"
-    ])
-
-    total_crates = get_total_crates("api-bindings")
-    logging.info(f"Total crates: {total_crates}")
-    per_page = 100
-    total_pages = total_crates // per_page + 1
-    for page in range(1, total_pages + 1):
-        print(f"\rPage: {page}/{total_pages}", end="")
-        crates, *time_info = get_crates(page, per_page, "api-bindings")
-        crates_info = []
+def parse_dot(path: str) -> DotGraph:
+    node_index = {}
+    names, labels, red, cluster = [], [], [], []
+    label_index = {}
+    label_table = []
+    cluster_names, cluster_labels = [], []
+    src, dst = array.array("i"), array.array("i")
+    # innermost open subgraph, None for the graph itself
+    stack = []
+
+    def intern(label: str) -> int:
+        index = label_index.get(label)
+        if index is None:
+            index = label_index[label] = len(label_table)
+            label_table.append(label)
+        return index
+
+    def node(name: str) -> int:
+        index = node_index.get(name)
+        if index is None:
+            index = node_index[name] = len(names)
+            names.append(name)
+            labels.append(-1)
+            red.append(False)
+            cluster.append(-1)
+        if stack and stack[-1] is not None and cluster[index] < 0:
+            cluster[index] = stack[-1]
+        return index
+
+    for statement in iter_dot_statements(path):
+        if not statement:
+            continue
+        if statement == "}" or statement == "};":
+            if stack:
+                stack.pop()
+            continue
+        if statement.endswith("{") and not stack:
+            # digraph G {
+            stack.append(None)
+            continue
+        # cheap checks first, the regexes only confirm the statement kind
+        match = statement.startswith("subgraph") and DOT_SUBGRAPH_RE.match(statement)
+        if match:
+            cluster_names.append(dot_unquote(match.group(1) or f"cluster{len(cluster_names)}"))
+            cluster_labels.append(intern(""))
+            stack.append(len(cluster_names) - 1)
+            continue
+        match = "->" in statement and DOT_EDGE_RE.match(statement)
+        if match:
+            chain = [node(dot_unquote(name)) for name in DOT_ID_RE.findall(match.group(1))]
+            src.extend(chain[:-1])
+            dst.extend(chain[1:])
+            continue
+        match = "[" not in statement and DOT_ATTR_STMT_RE.match(statement)
+        if match:
+            if match.group(1) == "label" and stack and stack[-1] is not None:
+                cluster_labels[stack[-1]] = intern(dot_unquote(match.group(2)))
+            continue
+        match = DOT_NODE_RE.match(statement)
+        if match and match.group(1) not in DOT_KEYWORDS:
+            index = node(dot_unquote(match.group(1)))
+            for key, value in DOT_ATTR_RE.findall(match.group(2) or ""):
+                if key == "label":
+                    labels[index] = intern(dot_unquote(value))
+                elif key == "color":
+                    red[index] = dot_unquote(value) == "red"
+            continue
+        logging.debug(f"{path}: skip dot statement {statement[:80]}")
+
+    n_nodes = len(names)
+    # parallel edges carry nothing for the analysis, keep each (src, dst) once
+    pairs = np.unique(np.frombuffer(src, dtype=np.int32).astype(np.int64) * n_nodes + np.frombuffer(dst, dtype=np.int32))
+    indptr, indices = csr_from_edges(pairs // max(n_nodes, 1), pairs % max(n_nodes, 1), n_nodes)
+    return DotGraph(
+        names, label_table,
+        np.array(labels, dtype=np.int32), np.array(red, dtype=bool),
+        np.array(cluster, dtype=np.int32), cluster_names, np.array(cluster_labels, dtype=np.int32),
+        indptr, indices,
+    )
+
+# cumulative reductions, the first level within the budget is rendered
+LOD_LEVELS = ["original", "chains", "ffi_paths", "functions"]
+
+def csr_gather(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    # neighbours of all the given nodes at once
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    return indices[offsets]
+
+def contract_graph(graph: DotGraph, group: np.ndarray, names: list, labels: list) -> DotGraph:
+    # node i becomes node group[i] of the new graph, -1 drops it, edges inside a group disappear
+    n_nodes = len(names)
+    cluster_labels = [graph.label_table[index] for index in graph.cluster_labels.tolist()]
+    label_table = list(dict.fromkeys(labels + cluster_labels))
+    label_index = {label: index for index, label in enumerate(label_table)}
+    kept = group >= 0
+    red = np.zeros(n_nodes, dtype=bool)
+    red[group[kept & graph.red]] = True
+    cluster = np.full(n_nodes, -1, dtype=np.int32)
+    cluster[group[kept]] = graph.cluster[kept]
+    src, dst = graph.edges()
+    src, dst = group[src], group[dst]
+    keep = (src >= 0) & (dst >= 0) & (src != dst)
+    pairs = np.unique(src[keep].astype(np.int64) * n_nodes + dst[keep])
+    indptr, indices = csr_from_edges(pairs // max(n_nodes, 1), pairs % max(n_nodes, 1), n_nodes)
+    return DotGraph(
+        names, label_table, np.array([label_index[label] for label in labels], dtype=np.int32), red,
+        cluster, graph.cluster_names, np.array([label_index[label] for label in cluster_labels], dtype=np.int32),
+        indptr, indices,
+    )
+
+def merge_chains(graph: DotGraph) -> DotGraph:
+    # u -> v with u's only successor and v's only predecessor in the same function become one node,
+    # FFI (red) nodes always stay visible on their own
+    src, dst = graph.edges()
+    outdeg = np.diff(graph.indptr)
+    indeg = np.bincount(dst, minlength=graph.n_nodes)
+    chain = (outdeg[src] == 1) & (indeg[dst] == 1) & (graph.cluster[src] == graph.cluster[dst]) & (src != dst)
+    chain &= ~graph.red[src] & ~graph.red[dst]
+    nxt = np.full(graph.n_nodes, -1, dtype=np.int64)
+    nxt[src[chain]] = dst[chain]
+    has_prev = np.zeros(graph.n_nodes, dtype=bool)
+    has_prev[dst[chain]] = True
+    group = [-1] * graph.n_nodes
+    names, labels = [], []
+    nxt = nxt.tolist()
+    # chain heads first, then whatever is left sits on a cycle
+    for start in np.concatenate([np.flatnonzero(~has_prev), np.flatnonzero(has_prev)]).tolist():
+        if group[start] >= 0:
+            continue
+        length = 0
+        node = start
+        while node >= 0 and group[node] < 0:
+            group[node] = len(names)
+            length += 1
+            node = nxt[node]
+        names.append(graph.names[start])
+        labels.append(graph.label(start) if length == 1 else f"{graph.label(start)}\n(+{length - 1} merged)")
+    return contract_graph(graph, np.array(group, dtype=np.int64), names, labels)
+
+def prune_ffi_paths(graph: DotGraph) -> DotGraph:
+    # keep only the nodes from which some FFI (red) node is reachable
+    if not graph.red.any():
+        return graph
+    rev_indptr, rev_indices = graph.reverse()
+    reached = graph.red.copy()
+    frontier = np.flatnonzero(reached)
+    while frontier.size:
+        frontier = np.unique(csr_gather(rev_indptr, rev_indices, frontier))
+        frontier = frontier[~reached[frontier]]
+        reached[frontier] = True
+    group = np.full(graph.n_nodes, -1, dtype=np.int64)
+    kept = np.flatnonzero(reached)
+    group[kept] = np.arange(len(kept))
+    return contract_graph(graph, group, [graph.names[i] for i in kept], [graph.label(i) for i in kept])
+
+def collapse_functions(graph: DotGraph) -> DotGraph:
+    # every function subgraph becomes one node named and labelled after the subgraph
+    clusters = np.unique(graph.cluster[graph.cluster >= 0])
+    loose = np.flatnonzero(graph.cluster < 0)
+    group = np.empty(graph.n_nodes, dtype=np.int64)
+    cluster_group = np.full(len(graph.cluster_names), -1, dtype=np.int64)
+    cluster_group[clusters] = np.arange(len(clusters))
+    group[graph.cluster >= 0] = cluster_group[graph.cluster[graph.cluster >= 0]]
+    group[loose] = len(clusters) + np.arange(len(loose))
+    names = [graph.cluster_names[c] for c in clusters.tolist()] + [graph.names[i] for i in loose.tolist()]
+    labels = [graph.label_table[graph.cluster_labels[c]] for c in clusters.tolist()] + [graph.label(i) for i in loose.tolist()]
+    reduced = contract_graph(graph, group, names, labels)
+    # a collapsed function is a plain node, not a member of its own subgraph
+    reduced.cluster[:len(clusters)] = -1
+    return reduced
+
+LOD_REDUCERS = [merge_chains, prune_ffi_paths, collapse_functions]
+
+def reduce_graph(graph: DotGraph, max_nodes: int, max_edges: int) -> tuple[DotGraph, int]:
+    level = 0
+    while (graph.n_nodes > max_nodes or graph.n_edges > max_edges) and level < len(LOD_REDUCERS):
+        graph = LOD_REDUCERS[level](graph)
+        level += 1
+    return graph, level
+
+def dot_quote(value: str) -> str:
+    return '"' + value.replace('"', '\\"') + '"'
+
+def dot_id(name: str) -> str:
+    return name if re.fullmatch(r"[\w.]+", name) else dot_quote(name)
+
+def write_dot(graph: DotGraph, path: str):
+    # same layout as the files ffi-checker writes, one subgraph block per function
+    with open(path, "w") as f:
+        f.write("digraph G {\n    rankdir=LR;\n")
+        order = np.argsort(graph.cluster, kind="stable")
+        cluster = graph.cluster[order]
+        starts = np.flatnonzero(np.diff(cluster, prepend=-2))
+        for start, end in zip(starts, np.append(starts[1:], len(order))):
+            current = cluster[start]
+            indent = "    "
+            if current >= 0:
+                f.write(f"    subgraph {dot_id(graph.cluster_names[current])} {{\n        style=filled;\n        color=lightgrey;\n"
+                        f"        label={dot_quote(graph.label_table[graph.cluster_labels[current]])};\n        rankdir=TB;\n")
+                indent = "        "
+            for node in order[start:end].tolist():
+                color = ", color=red" if graph.red[node] else ""
+                f.write(f"{indent}{dot_id(graph.names[node])} [label={dot_quote(graph.label(node))}{color}];\n")
+            if current >= 0:
+                f.write("    }\n")
+        src, dst = graph.edges()
+        for u, v in zip(src.tolist(), dst.tolist()):
+            f.write(f"    {dot_id(graph.names[u])} -> {dot_id(graph.names[v])};\n")
+        f.write("}\n")
+
+def lod_path(path: str) -> str:
+    return path[:-len(".dot")] + ".lod.dot"
+
+def skipped_path(path: str) -> str:
+    return path[:-len(".dot")] + ".render_skipped"
+
+def reduce_graphs(dirname: str, max_nodes: int, max_edges: int) -> dict:
+    stats = {}
+    for file, prefix in GRAPH_FILES.items():
+        path = os.path.join(os.getcwd(), "result_collect", dirname, file)
+        if not os.path.exists(path):
+            continue
+        graph = parse_dot(path)
+        reduced, level = reduce_graph(graph, max_nodes, max_edges)
+        # even the coarsest level can stay over budget, dot would spend hours on it, so it is not rendered at all
+        skipped = reduced.n_nodes > max_nodes or reduced.n_edges > max_edges
+        for stale in [lod_path(path), skipped_path(path)]:
+            if os.path.exists(stale):
+                os.remove(stale)
+        if skipped:
+            with open(skipped_path(path), "w") as f:
+                f.write(f"{reduced.n_nodes} nodes, {reduced.n_edges} edges\n")
+            logging.warning(f"{path} still has {reduced.n_nodes} nodes and {reduced.n_edges} edges at level "
+                            f"{LOD_LEVELS[level]}, render skipped")
+        elif level > 0:
+            write_dot(reduced, lod_path(path))
+            logging.info(f"Reduce {path} to level {LOD_LEVELS[level]}: {graph.n_nodes} -> {reduced.n_nodes} nodes, "
+                         f"{graph.n_edges} -> {reduced.n_edges} edges")
+        stats.update({
+            f"{prefix}_nodes": graph.n_nodes, f"{prefix}_edges": graph.n_edges,
+            f"{prefix}_reduced_nodes": reduced.n_nodes, f"{prefix}_reduced_edges": reduced.n_edges,
+            f"{prefix}_lod": level, f"{prefix}_render_skipped": int(skipped),
+        })
+    return stats
+
+def crate_record(crate: dict) -> dict:
+    name = crate['name']
+    repository: str = crate['repository']
+    if repository is None:
+        return None
+    if not repository.startswith("https://github"):
+        return None
+    if name in EXCLUDE_CRATE:
+        return None
+    repository = repository.rstrip("/")
+    dirname = repository.split("/")[-1].split(".")[0]
+    if dirname is None or len(dirname) == 0:
+        logging.info(f"\nError: Crate: {name} No directory name found")
+    return {"name": name, "repository": repository, "dirname": dirname}
+
+def new_crate_rows(listed: pd.DataFrame) -> pd.DataFrame:
+    df = listed.reindex(columns=CRATES_COLUMNS)
+    for column, value in COLUMN_DEFAULTS.items():
+        df[column] = value
+    return df
+
+def merge_crates(existing: pd.DataFrame, listed: pd.DataFrame) -> pd.DataFrame:
+    # existing rows keep their position and results, so --skip/--limit ranges stay stable
+    existing = existing.set_index("name", drop=False)
+    listed = listed.set_index("name", drop=False)
+    added = listed.index.difference(existing.index, sort=False)
+    gone = existing.index.difference(listed.index, sort=False)
+    common = existing.index.intersection(listed.index, sort=False)
+    moved = common[existing.loc[common, "repository"].to_numpy() != listed.loc[common, "repository"].to_numpy()]
+    returned = common[~existing.loc[common, "listed"].to_numpy()]
+
+    merged = existing.copy()
+    merged["listed"] = merged.index.isin(listed.index)
+    merged["previous_repository"] = merged["previous_repository"].astype(object)
+    merged.loc[moved, "previous_repository"] = merged.loc[moved, "repository"]
+    merged.loc[moved, ["repository", "dirname"]] = listed.loc[moved, ["repository", "dirname"]].to_numpy()
+
+    new_rows = new_crate_rows(listed.loc[added])
+    new_rows = new_rows[~new_rows["repository"].isin(merged["repository"])]
+    logging.info(f"Refresh: {len(new_rows)} added, {len(gone)} no longer listed, "
+                 f"{len(returned)} listed again, {len(moved)} repository changed")
+    for name in moved:
+        logging.info(f"Crate {name} moved from {merged.loc[name, 'previous_repository']} to {merged.loc[name, 'repository']}")
+    return pd.concat([merged, new_rows], ignore_index=True)
+
+def list_crates(client: CratesClient, workers: int) -> pd.DataFrame:
+    records = []
+    for crates in fetch_all_crates(client, "api-bindings", workers):
         for crate in crates:
-            name = crate['name']
-            repository: str = crate['repository']
-            if repository is None:
-                continue
-            if not repository.startswith("https://github"):
-                continue
-            if name in EXCLUDE_CRATE:
-                continue
-            repository = repository.rstrip("/")
-            dirname = repository.split("/")[-1].split(".")[0]
-            if dirname is None or len(dirname) == 0:
-                logging.info(f"\nError: Crate: {name} No directory name found")
-            valid_proj = False
-            build_success = False
-            normal_build_time = None
-            ffi_checker_success = False
-            ffi_checker_build_time = None
-            ffi_checker_analysis_time = None
-            crate_info = {
-                "name": name,
-                "repository": repository,
-                "dirname": dirname,
-                "valid_proj": valid_proj,
-                "build_success": build_success,
-                "normal_build_time": normal_build_time,
-                "ffi_checker_success": ffi_checker_success,
-                "ffi_checker_build_time": ffi_checker_build_time,
-                "ffi_checker_analysis_time": ffi_checker_analysis_time
-            }
-            crates_info.append(crate_info)
-        tmp_df = pd.DataFrame(crates_info)
-        df = pd.concat([df, tmp_df], ignore_index=True)
-    df.drop_duplicates(subset=["repository"], keep="first", inplace=True)
-    df.to_csv("crates.csv", index=False)
-    logging.info("\nCrates list saved to crates.csv")
+            record = crate_record(crate)
+            if record is not None:
+                records.append(record)
+    listed = pd.DataFrame(records, columns=["name", "repository", "dirname"])
+    listed.drop_duplicates(subset=["name"], keep="first", inplace=True)
+    listed.drop_duplicates(subset=["repository"], keep="first", inplace=True)
+    return listed
+
+def init(args: argparse.Namespace):
+    if args.refresh:
+        os.makedirs("proj_collect", exist_ok=True)
+        os.makedirs("result_collect", exist_ok=True)
+    else:
+        os.mkdir("proj_collect")
+        os.mkdir("result_collect")
+    logging.info("Create directories: proj_collect, result_collect")
+
+    cache = None if args.no_cache else HttpCache(args.cache_dir, args.cache_ttl, args.cache_max_mb * 1024 * 1024)
+    client = CratesClient(args.base_url, args.fetch_workers, args.rate, cache, args.offline)
+    listed = list_crates(client, args.fetch_workers)
+
+    existing = load_crates() if args.refresh else None
+    if existing is not None and len(existing) > 0:
+        df = merge_crates(existing, listed)
+    else:
+        df = new_crate_rows(listed)
+    conn = db_connect()
+    try:
+        db_replace_crates(conn, df)
+    finally:
+        conn.close()
+    export_results("crates.csv")
+    logging.info(f"\nCrates list saved to {RESULTS_DB} and crates.csv")
     pass
 
+def snapshot(args: argparse.Namespace) -> bool:
+    # record the catalogue pages and mirror the repositories once, the fixture server replays them offline
+    client = CratesClient(args.base_url, args.fetch_workers, args.rate, None, False, args.output)
+    listed = list_crates(client, args.fetch_workers)
+    repos = listed["repository"].iloc[args.skip:]
+    if args.limit is not None:
+        repos = repos.iloc[:args.limit]
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="snapshot") as pool:
+        results = list(pool.map(lambda url: snapshot_repo(url, args.output), repos))
+    failed = [url for url, ok in zip(repos, results) if not ok]
+    for url in failed:
+        logging.error(f"Snapshot {url} failed")
+    print(f"Snapshot {args.output}: {len(listed)} crates listed, {len(repos) - len(failed)}/{len(repos)} repositories mirrored")
+    return not failed
+
+def serve(args: argparse.Namespace):
+    FixtureHandler.snapshot_dir = os.path.abspath(args.snapshot)
+    server = ThreadingHTTPServer((args.host, args.port), FixtureHandler)
+    host, port = server.server_address[:2]
+    print(f"Serving {args.snapshot} on http://{host}:{port}")
+    print(f"  init  --base-url http://{host}:{port}{FIXTURE_API_PREFIX}")
+    print(f"  build --git-rewrite https://=http://{host}:{port}/git/")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def apply_git_rewrites(rules: list):
+    # git reads GIT_CONFIG_COUNT/KEY_n/VALUE_n as extra config, so clones, mirrors and submodules all follow it
+    count = int(os.environ.get("GIT_CONFIG_COUNT", "0"))
+    for rule in rules or []:
+        prefix, sep, target = rule.partition("=")
+        if not sep or not prefix or not target:
+            raise ValueError(f"--git-rewrite expects FROM=TO, got {rule!r}")
+        os.environ[f"GIT_CONFIG_KEY_{count}"] = f"url.{target}.insteadOf"
+        os.environ[f"GIT_CONFIG_VALUE_{count}"] = prefix
+        count += 1
+        logging.info(f"Rewrite git urls {prefix} -> {target}")
+    os.environ["GIT_CONFIG_COUNT"] = str(count)
+
+def crate_path(dirname: str, *parts) -> str:
+    return os.path.join(os.getcwd(), "proj_collect", dirname, *parts)
+
+def stage_clone(row, args: argparse.Namespace) -> dict:
+    # a directory without a completed clone marker is a leftover of an interrupted run
+    shutil.rmtree(crate_path(row.dirname), ignore_errors=True)
+    reference = None
+    mirror_bytes = 0
+    mirror_time = 0.0
+    # a full history mirror would cost more than the single commit a shallow clone fetches
+    if args.mirror_dir and not args.shallow:
+        path = mirror_path(args.mirror_dir, row.repository)
+        size_before = dir_size(path)
+        ret_mirror, mirror_usage = update_mirror(row.repository, path, args.partial)
+        if ret_mirror:
+            reference = path
+            mirror_bytes = dir_size(path) - size_before
+            mirror_time = mirror_usage.real_time
+    ret_clone, clone_usage = clone_crate(row.repository, row.dirname, reference, args.shallow, args.partial)
+    if not ret_clone:
+        return None
+    # with alternates the clone's own .git only holds what the mirror did not have
+    clone_bytes = mirror_bytes + dir_size(crate_path(row.dirname, ".git"))
+    logging.info(f"Clone {row.name}: {clone_bytes / 1e6:.1f}MB in {mirror_time + clone_usage.real_time:.2f}s")
+    return {"clone_real_s": mirror_time + clone_usage.real_time, "clone_bytes": clone_bytes}
+
+def stage_submodules(row, args: argparse.Namespace) -> dict:
+    ret_submodule, submodule_usage = init_submodule(row.dirname, args.shallow)
+    if not ret_submodule:
+        return None
+    submodule_bytes = dir_size(crate_path(row.dirname, ".git", "modules"))
+    logging.info(f"Submodules {row.name}: {submodule_bytes / 1e6:.1f}MB in {submodule_usage.real_time:.2f}s")
+    return {"submodule_real_s": submodule_usage.real_time, "submodule_bytes": submodule_bytes}
+
+def stage_toolchain(row, args: argparse.Namespace) -> dict:
+    if not override_toolchain(row.dirname, vendor=not args.vendor_store):
+        return None
+    if not args.vendor_store:
+        return {}
+    try:
+        vendor_stats = vendor_crate(row.dirname, args.vendor_store)
+    except Exception as e:
+        logging.error(f"Vendor {row.name} failed: {e}")
+        vendor_stats = None
+    if vendor_stats is None:
+        # the store cannot serve this crate, vendor it the old way instead of silently building online
+        logging.info(f"Vendor {row.name} with cargo vendor instead of the store")
+        if not override_toolchain(row.dirname, vendor=True):
+            return None
+        return {}
+    return vendor_stats
+
+def stage_build(row, args: argparse.Namespace) -> dict:
+    ret_clean = cargo_clean(row.dirname)
+    with isolated(args, row.dirname, "normal_build") as isolation:
+        ret_build, build_usage = build_crate(row.dirname)
+    if not (ret_clean and ret_build):
+        return None
+    updates = usage_columns("normal_build", build_usage)
+    updates.update(isolation)
+    updates["build_success"] = True
+    return updates
+
+def stage_gen_ir(row, args: argparse.Namespace) -> dict:
+    ret_clean = cargo_clean(row.dirname)
+    with isolated(args, row.dirname, "ffi_checker_build") as isolation:
+        ret_gen_ir, ffi_checker_build_usage = gen_crate_ir(row.dirname)
+    if not (ret_clean and ret_gen_ir):
+        return None
+    updates = usage_columns("ffi_checker_build", ffi_checker_build_usage)
+    updates.update(isolation)
+    updates["ffi_checker_success"] = True
+    if args.trials > 1:
+        trial_stats = run_trials(row, args)
+        if trial_stats is None:
+            return None
+        updates.update(trial_stats)
+    return updates
+
+def median_ci(values: np.ndarray, confidence: float = TRIAL_CONFIDENCE) -> tuple[float, float]:
+    # distribution free: order statistics k and n-1-k bracket the median with the binomial(n, 1/2) probability
+    values = np.sort(values)
+    n = len(values)
+    k = 0
+    while k + 1 < n - 1 - (k + 1) and 1 - 2 * sum(math.comb(n, i) for i in range(k + 2)) / 2 ** n >= confidence:
+        k += 1
+    return float(values[k]), float(values[n - 1 - k])
+
+def robust_stats(prefix: str, values: list) -> dict:
+    values = np.asarray(values, dtype=np.float64)
+    median = float(np.median(values))
+    ci_low, ci_high = median_ci(values)
+    return {
+        f"{prefix}_median": median,
+        f"{prefix}_mad": float(np.median(np.abs(values - median))),
+        f"{prefix}_ci_low": ci_low,
+        f"{prefix}_ci_high": ci_high,
+    }
+
+def run_trials(row, args: argparse.Namespace) -> dict:
+    # paired clean builds with and without the checker, so both see the same page cache and machine load
+    runs = {"normal_build": build_crate, "ffi_checker_build": gen_crate_ir}
+    samples = {stage: [] for stage in TRIAL_STAGES}
+    ratios = []
+    total = args.warmup + args.trials
+    for trial in range(total):
+        # alternate which build goes first, counted from the end so the last build leaves the checker's IR behind
+        order = TRIAL_STAGES if not args.alternate or (total - 1 - trial) % 2 == 0 else TRIAL_STAGES[::-1]
+        usages = {}
+        for stage in order:
+            if not cargo_clean(row.dirname):
+                return None
+            with isolated(args, row.dirname, stage):
+                ret, usage = runs[stage](row.dirname)
+            if not ret:
+                return None
+            usages[stage] = usage_columns(stage, usage)
+        if trial < args.warmup:
+            continue
+        for stage in TRIAL_STAGES:
+            samples[stage].append(usages[stage])
+        ratios.append(usages["ffi_checker_build"]["ffi_checker_build_real_s"] / usages["normal_build"]["normal_build_real_s"])
+    stats = {"trials": args.trials}
+    for stage in TRIAL_STAGES:
+        for metric in TRIAL_METRICS:
+            stats.update(robust_stats(f"{stage}_{metric}", [sample[f"{stage}_{metric}"] for sample in samples[stage]]))
+    stats.update(robust_stats("ffi_checker_ratio", ratios))
+    logging.info(f"Trials {row.name}: {args.trials} runs, ffi checker/normal real time "
+                 f"{stats['ffi_checker_ratio_median']:.2f}x [{stats['ffi_checker_ratio_ci_low']:.2f}, {stats['ffi_checker_ratio_ci_high']:.2f}]")
+    return stats
+
+def stage_validate(row, args: argparse.Namespace) -> dict:
+    if not args.index_ffi:
+        ret_valid = check_valid(row.dirname)
+        outputs = {"valid_proj": ret_valid}
+    else:
+        entries = index_ffi_entries(row.dirname)
+        ret_valid = len(entries) > 0
+        conn = db_connect()
+        try:
+            db_replace_ffi_index(conn, row.name, entries)
+        finally:
+            conn.close()
+        outputs = {"valid_proj": ret_valid, "ffi_symbols": len({symbol for symbol, _ in entries})}
+    if not ret_valid:
+        # crates without FFI are finished here, drop the checkout to save disk
+        shutil.rmtree(crate_path(row.dirname), ignore_errors=True)
+    return outputs
+
+def stage_analyze(row, args: argparse.Namespace) -> dict:
+    with isolated(args, row.dirname, "ffi_checker_analysis") as isolation:
+        ret_analysis, analysis_usage = analyze_crate(row.dirname)
+    if not ret_analysis:
+        return None
+    return {**usage_columns("ffi_checker_analysis", analysis_usage), **isolation}
+
+def stage_copy_results(row, args: argparse.Namespace) -> dict:
+    cp_result(row.dirname)
+    return {}
+
+def stage_reduce(row, args: argparse.Namespace) -> dict:
+    try:
+        return reduce_graphs(row.dirname, args.render_max_nodes, args.render_max_edges)
+    except Exception as e:
+        # the originals are still rendered, dot decides whether they are too large
+        logging.exception(f"Reduce graphs of {row.name} failed: {e}")
+        return {}
+
+def render_job(row, args: argparse.Namespace) -> bool:
+    set_log_context(row.dirname, "rendered")
+    try:
+        stats = render_graph(row.dirname, args.render_format, args.render_cache, getattr(args, "force", False))
+    finally:
+        set_log_context(None, None)
+    if not stats["render_success"]:
+        logging.warning(f"Render {row.name} failed")
+    conn = db_connect()
+    try:
+        db_update_crate(conn, row.name, stats)
+    finally:
+        conn.close()
+    return stats["render_success"]
+
+def stage_render(row, args: argparse.Namespace) -> dict:
+    # a graph dot cannot render is not a build failure, rerunning would fail the same way;
+    # dot runs in the render pool so the build worker moves on to the next crate
+    render_pool = getattr(args, "render_pool", None)
+    if render_pool is None:
+        render_job(row, args)
+    else:
+        args.render_futures.append(render_pool.submit(render_job, row, args))
+    return {}
+
+def rendered(row, fmt: str = RENDER_FORMAT) -> bool:
+    dest_dir = result_path(row.dirname)
+    return all(
+        os.path.exists(render_output(dest_dir, file, fmt))
+        for file in GRAPH_FILES
+        if os.path.exists(os.path.join(dest_dir, file)) and not os.path.exists(skipped_path(os.path.join(dest_dir, file)))
+    )
+
+def result_path(dirname: str, *parts) -> str:
+    return os.path.join(os.getcwd(), "result_collect", dirname, *parts)
+
+# (stage, run, check that the stage's outputs are still on disk)
+BUILD_STAGES = [
+    ("cloned", stage_clone, lambda row, args: os.path.isdir(crate_path(row.dirname, ".git"))),
+    ("submodules", stage_submodules, lambda row, args: os.path.isdir(crate_path(row.dirname))),
+    ("toolchain", stage_toolchain, lambda row, args: os.path.isdir(crate_path(row.dirname))),
+    ("built", stage_build, lambda row, args: os.path.isdir(crate_path(row.dirname))),
+    ("ir_generated", stage_gen_ir, lambda row, args: os.path.isdir(crate_path(row.dirname, "target", "entry_points"))),
+    ("validated", stage_validate, lambda row, args: True),
+    ("analyzed", stage_analyze, lambda row, args: os.path.exists(crate_path(row.dirname, "interface.json"))),
+    ("results_copied", stage_copy_results, lambda row, args: os.path.exists(result_path(row.dirname, "interface.json"))),
+    ("reduced", stage_reduce, lambda row, args: True),
+    ("rendered", stage_render, lambda row, args: rendered(row, args.render_format)),
+]
+STAGE_NAMES = [stage for stage, _, _ in BUILD_STAGES]
+STATE_DIR = os.path.join("proj_collect", ".eval_state")
+
+def state_path(dirname: str) -> str:
+    return os.path.join(os.getcwd(), STATE_DIR, dirname + ".json")
+
+def load_state(row) -> dict:
+    try:
+        with open(state_path(row.dirname), "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {"repository": row.repository, "stages": {}}
+    if state.get("repository") != row.repository:
+        logging.info(f"{row.name} repository changed, discard its checkpoints")
+        return {"repository": row.repository, "stages": {}}
+    return state
+
+def save_state(row, state: dict):
+    path = state_path(row.dirname)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+def drop_stages(state: dict, first_stage: str, dirname: str = None):
+    for stage in STAGE_NAMES[STAGE_NAMES.index(first_stage):]:
+        state["stages"].pop(stage, None)
+        if dirname is not None and os.path.exists(stage_log_path(dirname, stage)):
+            # a rerun stage starts a fresh log
+            os.remove(stage_log_path(dirname, stage))
+
+def read_log_tail(dirname: str, stage: str) -> str:
+    # streams through the compressed log, only the last LOG_TAIL_BYTES are ever held
+    tail = bytearray()
+    try:
+        with gzip.open(stage_log_path(dirname, stage), "rb") as f:
+            while chunk := f.read(65536):
+                tail += chunk
+                del tail[:-LOG_TAIL_BYTES]
+    except (OSError, EOFError):
+        pass
+    return bytes(tail).decode(errors="replace")
+
+# stage -> duration columns of the same crate that predict its limit, first one known wins
+TIMEOUT_HISTORY = {
+    "built": ["normal_build_real_s"],
+    "ir_generated": ["ffi_checker_build_real_s", "normal_build_real_s"],
+    "analyzed": ["ffi_checker_analysis_real_s", "ffi_checker_build_real_s"],
+}
+
+def known_value(values: dict, column: str) -> float | None:
+    value = values.get(column)
+    return None if value is None or pd.isna(value) else float(value)
+
+# a previous run may have had more cargo jobs, its cpu time spread over the current budget bounds the wall time from below
+def history_duration(history: dict, column: str) -> float | None:
+    real = known_value(history, column)
+    if real is None:
+        return None
+    prefix = column[:-len("_real_s")]
+    user, sys_ = known_value(history, f"{prefix}_user_s"), known_value(history, f"{prefix}_sys_s")
+    if user is None or sys_ is None:
+        return real
+    cargo_jobs = int(os.environ.get("CARGO_BUILD_JOBS") or os.cpu_count() or 1)
+    return max(real, (user + sys_) / cargo_jobs)
+
+def predict_timeout(stage: str, measured: dict, history: dict, args: argparse.Namespace) -> float:
+    columns = TIMEOUT_HISTORY.get(stage, [])
+    # what this run measured in earlier stages first, previous results of the crate only as a fallback
+    candidates = [known_value(measured, column) for column in columns] + [history_duration(history, column) for column in columns]
+    duration = next((value for value in candidates if value is not None), None)
+    predicted = SUB_PROCESS_TIMEOUT
+    if duration is not None:
+        predicted = float(np.clip(duration * args.timeout_factor, args.timeout_floor, SUB_PROCESS_TIMEOUT))
+    # a stage killed last time never recorded a longer duration, double its previous limit instead
+    if history.get("timeout_stage") == stage:
+        limit = known_value(history, "timeout_limit_s")
+        if limit is None:
+            return SUB_PROCESS_TIMEOUT
+        return float(min(max(limit * 2, predicted), SUB_PROCESS_TIMEOUT))
+    return predicted
+
+# stage -> measured duration columns, together they add up to the wall time of one crate
+STAGE_COST_COLUMNS = {
+    "cloned": ["clone_real_s"],
+    "submodules": ["submodule_real_s"],
+    "toolchain": ["vendor_real_s"],
+    "built": ["normal_build_real_s"],
+    "ir_generated": ["ffi_checker_build_real_s"],
+    "analyzed": ["ffi_checker_analysis_real_s"],
+}
+COST_COLUMNS = [column for columns in STAGE_COST_COLUMNS.values() for column in columns]
+
+def predict_costs(df: pd.DataFrame, args: argparse.Namespace) -> pd.Series:
+    # unseen crates: seconds per cloned byte of the measured ones times the mirror size, else their median
+    size = df["clone_bytes"].copy()
+    if args.mirror_dir:
+        unsized = size.isna() & df[COST_COLUMNS].isna().all(axis=1)
+        size[unsized] = [
+            dir_size(mirror_path(args.mirror_dir, url)) or np.nan if isinstance(url, str) else np.nan
+            for url in df.loc[unsized, "repository"]
+        ]
+    estimates = {}
+    for stage, columns in STAGE_COST_COLUMNS.items():
+        measured = df[columns].sum(axis=1, min_count=1)
+        known = measured.notna() & (size > 0)
+        rate = (measured[known] / size[known]).median() if known.any() else np.nan
+        fallback = measured.median() if measured.notna().any() else DEFAULT_CRATE_COST / len(STAGE_COST_COLUMNS)
+        estimates[stage] = measured.fillna(size * rate).fillna(fallback)
+    if args.trials > 1:
+        # every trial repeats both clean builds on top of the first checker build
+        estimates["ir_generated"] = estimates["ir_generated"] + (args.warmup + args.trials) * (estimates["built"] + estimates["ir_generated"])
+    # only the stages this run will execute, checkpointed ones are skipped
+    pending = np.zeros((len(df), len(STAGE_COST_COLUMNS)))
+    for index, row in enumerate(df.itertuples()):
+        stage = resume_stage(row, load_state(row)["stages"], args)
+        if stage is None:
+            continue
+        remaining = STAGE_NAMES[STAGE_NAMES.index(stage):]
+        pending[index] = [name in remaining for name in STAGE_COST_COLUMNS]
+    costs = pd.DataFrame(estimates, index=df.index).to_numpy() * pending
+    return pd.Series(costs.sum(axis=1), index=df.index)
+
+# whole command group peaks first, single process maxrss of older results as a lower bound
+PEAK_RSS_COLUMNS = ["peak_rss_kb"] + [f"{stage}_peak_rss_kb" for stage in TIMED_STAGES] + [f"{stage}_maxrss_kb" for stage in TIMED_STAGES]
+
+def predict_peak_rss(df: pd.DataFrame) -> pd.Series:
+    peaks = df[PEAK_RSS_COLUMNS].max(axis=1)
+    fallback = peaks.median() if peaks.notna().any() else DEFAULT_PEAK_RSS_KB
+    return peaks.fillna(fallback)
+
+def mem_available_kb() -> int:
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 1024
+
+def mem_headroom_kb(running: dict) -> int:
+    # memory the running crates are predicted to take on top of what they already hold
+    with RUNNING_RSS_LOCK:
+        outstanding = sum(max(0, peak - RUNNING_RSS.get(dirname, 0)) for dirname, peak in running.values())
+    return mem_available_kb() - outstanding
+
+def predict_makespan(costs: list[float], jobs: int) -> float:
+    # greedy list scheduling, each crate goes to the worker that frees up first
+    workers = [0.0] * jobs
+    for cost in costs:
+        workers[workers.index(min(workers))] += cost
+    return max(workers)
+
+def resume_stage(row, stages: dict, args: argparse.Namespace) -> str:
+    # first stage this run executes, every later one runs again too; None when the crate is done
+    if "validated" in stages and not stages["validated"]["outputs"]["valid_proj"]:
+        return None
+    # analysis only reruns the analysis stages on whatever checkout is there
+    if args.analysis_only:
+        return "analyzed"
+    # resume at the first stage whose marker or outputs are missing
+    for stage, _, check in BUILD_STAGES:
+        # a crate measured with fewer trials than asked for is measured again from the checker build on
+        retrial = stage == "ir_generated" and stage in stages and stages[stage]["outputs"].get("trials", 1) < args.trials
+        if stage not in stages or not check(row, args) or retrial:
+            return stage
+    return None
+
+def build_one(row, args: argparse.Namespace) -> tuple[bool, dict]:
+    logging.debug(f"Row: {row}")
+    logging.info("Building crate: {}".format(row.name))
+    state = load_state(row)
+    stages = state["stages"]
+    first_stage = STAGE_NAMES.index("analyzed") if args.analysis_only else 0
+    stage = resume_stage(row, stages, args)
+    if stage is not None:
+        drop_stages(state, stage, row.dirname)
+
+    updates = {"failed_stage": None, "log_tail": None, "timeout_stage": None, "timeout_limit_s": None, "timeout_cpu_s": None}
+    history = row._asdict()
+    saved_time = 0.0
+    success = True
+    for stage, run, _ in BUILD_STAGES:
+        if STAGE_NAMES.index(stage) < first_stage and stage not in stages:
+            continue
+        if stage in stages:
+            saved_time += stages[stage]["real_s"]
+            updates.update(stages[stage]["outputs"])
+            if stage == "validated" and not stages[stage]["outputs"]["valid_proj"]:
+                break
+            continue
+        start = time.perf_counter()
+        timeout = predict_timeout(stage, updates, history, args) if args.adaptive_timeout else SUB_PROCESS_TIMEOUT
+        set_log_context(row.dirname, stage, timeout)
+        timeouts = _log_context.timeouts
+        metrics = getattr(args, "metrics", None)
+        if metrics:
+            metrics.stage_started(row.dirname, stage)
+        outputs = None
+        try:
+            outputs = run(row, args)
+        finally:
+            set_log_context(None, None)
+            if metrics:
+                metrics.stage_finished(stage, time.perf_counter() - start, outputs is not None, bool(timeouts))
+        if timeouts:
+            updates["timeout_stage"] = stage
+            updates["timeout_limit_s"] = timeouts[-1][0]
+            updates["timeout_cpu_s"] = sum(cpu for _, cpu in timeouts)
+        if outputs is None:
+            logging.error(f"{row.name} failed at stage {stage}, see {stage_log_path(row.dirname, stage)}")
+            updates["failed_stage"] = stage
+            updates["log_tail"] = read_log_tail(row.dirname, stage)
+            success = False
+            break
+        stages[stage] = {"real_s": time.perf_counter() - start, "outputs": outputs, "finished_at": time.time()}
+        save_state(row, state)
+        updates.update(outputs)
+        if stage == "validated" and not outputs["valid_proj"]:
+            break
+    peaks = [updates.get(f"{stage}_peak_rss_kb") for stage in TIMED_STAGES]
+    peaks = [peak for peak in peaks if peak is not None and not pd.isna(peak)]
+    updates["peak_rss_kb"] = max(peaks) if peaks else None
+    if saved_time > 0:
+        logging.info(f"{row.name} resumed from checkpoints, {saved_time:.2f}s of finished stages skipped")
+    updates["resume_saved_s"] = saved_time
+    logging.debug(f"Build {row.name}\tresult:{success}")
+    return success, updates
+
+def prom_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class PipelineMetrics:
+    # live state of a build run, rendered in the prometheus text format
+    def __init__(self, total: int):
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.total = total
+        self.started = 0
+        self.crates = {"success": 0, "failure": 0}
+        self.failures = {}
+        self.timeouts = {}
+        # dirname -> [crate name, current stage, stage start]
+        self.running = {}
+        self.buckets = {stage: [0] * len(STAGE_BUCKETS) for stage in STAGE_NAMES}
+        self.stage_sum = dict.fromkeys(STAGE_NAMES, 0.0)
+        self.stage_count = dict.fromkeys(STAGE_NAMES, 0)
+        self.disk_bytes = None
+
+    def crate_started(self, row):
+        with self.lock:
+            self.started += 1
+            self.running[row.dirname] = [row.name, None, time.time()]
+
+    def stage_started(self, dirname: str, stage: str):
+        with self.lock:
+            if dirname in self.running:
+                self.running[dirname][1:] = [stage, time.time()]
+
+    def stage_finished(self, stage: str, seconds: float, ok: bool, timed_out: bool):
+        with self.lock:
+            for index, bound in enumerate(STAGE_BUCKETS):
+                if seconds <= bound:
+                    self.buckets[stage][index] += 1
+            self.stage_sum[stage] += seconds
+            self.stage_count[stage] += 1
+            if not ok:
+                self.failures[stage] = self.failures.get(stage, 0) + 1
+            if timed_out:
+                self.timeouts[stage] = self.timeouts.get(stage, 0) + 1
+
+    def crate_finished(self, dirname: str, success: bool):
+        with self.lock:
+            self.running.pop(dirname, None)
+            self.crates["success" if success else "failure"] += 1
+
+    def render(self) -> str:
+        now = time.time()
+        lines = []
+        def metric(name: str, kind: str, help_text: str, samples: list):
+            lines.append(f"# HELP collect_proj_{name} {help_text}")
+            lines.append(f"# TYPE collect_proj_{name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{key}="{prom_label(val)}"' for key, val in labels.items())
+                lines.append(f"collect_proj_{name}{suffix}{{{label_text}}} {value}" if label_text else f"collect_proj_{name}{suffix} {value}")
+        with self.lock:
+            finished = sum(self.crates.values())
+            hours = (now - self.start) / 3600
+            metric("crates_total", "counter", "Crates finished by outcome",
+                   [("", {"status": status}, count) for status, count in self.crates.items()])
+            metric("stage_failures_total", "counter", "Crates that failed at a stage",
+                   [("", {"stage": stage}, count) for stage, count in self.failures.items()])
+            metric("stage_timeouts_total", "counter", "Stages whose commands were killed by their timeout",
+                   [("", {"stage": stage}, count) for stage, count in self.timeouts.items()])
+            metric("throughput_crates_per_hour", "gauge", "Finished crates per hour since the run started",
+                   [("", {}, f"{finished / hours:.3f}" if hours > 0 else 0)])
+            metric("queue_depth", "gauge", "Crates not started yet",
+                   [("", {}, self.total - self.started)])
+            metric("running_crates", "gauge", "Crates being built",
+                   [("", {}, len(self.running))])
+            metric("running_crate_stage_seconds", "gauge", "Seconds the running crate has spent in its current stage",
+                   [("", {"crate": name, "stage": stage or "waiting"}, f"{now - since:.1f}") for name, stage, since in self.running.values()])
+            samples = []
+            for stage in STAGE_NAMES:
+                if not self.stage_count[stage]:
+                    continue
+                for bound, count in zip(STAGE_BUCKETS, self.buckets[stage]):
+                    samples.append(("_bucket", {"stage": stage, "le": bound}, count))
+                samples.append(("_bucket", {"stage": stage, "le": "+Inf"}, self.stage_count[stage]))
+                samples.append(("_sum", {"stage": stage}, f"{self.stage_sum[stage]:.3f}"))
+                samples.append(("_count", {"stage": stage}, self.stage_count[stage]))
+            metric("stage_duration_seconds", "histogram", "Wall time of the stages run", samples)
+            if self.disk_bytes is not None:
+                metric("disk_usage_bytes", "gauge", "Bytes used by the checkouts and build outputs",
+                       [("", {"path": "proj_collect"}, self.disk_bytes)])
+            metric("start_time_seconds", "gauge", "Unix time the run started", [("", {}, f"{self.start:.0f}")])
+        return "\n".join(lines) + "\n"
+
+def write_textfile(metrics: PipelineMetrics, path: str):
+    # node_exporter's textfile collector may read at any time, never let it see a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(metrics.render())
+    os.replace(tmp, path)
+
+def start_metrics_exporter(metrics: PipelineMetrics, args: argparse.Namespace):
+    stop = threading.Event()
+    server = None
+    if args.metrics_port is not None:
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+        server = ThreadingHTTPServer((args.metrics_host, args.metrics_port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info(f"Metrics on http://{args.metrics_host}:{server.server_address[1]}/metrics")
+
+    def loop():
+        # walking proj_collect is slow on a large run, refresh it far less often than the textfile
+        next_disk = 0.0
+        while True:
+            if time.time() >= next_disk:
+                disk_bytes = dir_size(os.path.join(os.getcwd(), "proj_collect"))
+                with metrics.lock:
+                    metrics.disk_bytes = disk_bytes
+                next_disk = time.time() + METRICS_DISK_INTERVAL
+            if args.metrics_textfile:
+                write_textfile(metrics, args.metrics_textfile)
+            if stop.wait(METRICS_INTERVAL):
+                break
+    thread = threading.Thread(target=loop, name="metrics", daemon=True)
+    thread.start()
+
+    def shutdown():
+        stop.set()
+        thread.join()
+        if args.metrics_textfile:
+            disk_bytes = dir_size(os.path.join(os.getcwd(), "proj_collect"))
+            with metrics.lock:
+                metrics.disk_bytes = disk_bytes
+            write_textfile(metrics, args.metrics_textfile)
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    return shutdown
+
+def build_job(row, args: argparse.Namespace, cost: float = None) -> bool:
+    # two crates can share a repository name, never let them race on the same directory
+    with DIRNAME_LOCKS_GUARD:
+        lock = DIRNAME_LOCKS.setdefault(row.dirname, threading.Lock())
+    metrics = getattr(args, "metrics", None)
+    with lock:
+        if metrics:
+            metrics.crate_started(row)
+        try:
+            success, updates = build_one(row, args)
+        except Exception as e:
+            logging.exception(f"Build {row.name} crashed: {e}")
+            if metrics:
+                metrics.crate_finished(row.dirname, False)
+            return False
+    if metrics:
+        metrics.crate_finished(row.dirname, success)
+    updates["predicted_cost_s"] = cost
+    # every job commits its own row, nothing else is rewritten
+    conn = db_connect()
+    try:
+        db_update_crate(conn, row.name, updates)
+    finally:
+        conn.close()
+    return success
+
+def interrupt_build(pools: list, futures: list):
+    for future in futures:
+        future.cancel()
+    killed = kill_live_groups()
+    logging.error(f"Interrupted, killed {killed} running commands")
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
 def build(args: argparse.Namespace) -> bool:
-    df = pd.read_csv("crates.csv")
+    df = load_crates()
     skip_cnt = args.skip
     limit = args.limit
     target_df = df.iloc[skip_cnt:skip_cnt+limit]
     if args.valid_only:
         print("Build Valid Proj Only")
         target_df = target_df[target_df["valid_proj"] == True]
+
+    jobs = max(1, args.jobs)
+    costs = predict_costs(target_df, args)
+    row_makespan = predict_makespan(costs.tolist(), jobs)
+    if args.order == "cost":
+        # longest predicted first so no long crate is left alone at the end of the batch
+        order = costs.sort_values(ascending=False, kind="stable").index
+        target_df = target_df.loc[order]
+        costs = costs.loc[order]
+    makespan = predict_makespan(costs.tolist(), jobs)
+    logging.info(f"Predicted makespan with {jobs} jobs: {makespan:.0f}s in {args.order} order, "
+                 f"{row_makespan:.0f}s in row order, {costs.sum():.0f}s of work")
+    if args.dry_run:
+        print(f"{'name':<40} {'predicted_s':>12}")
+        for name, cost in zip(target_df["name"], costs):
+            print(f"{name:<40} {cost:>12.0f}")
+        print(f"Predicted makespan with {jobs} jobs: {makespan:.0f}s ({args.order} order), "
+              f"{row_makespan:.0f}s (row order), lower bound {max(costs.max(), costs.sum() / jobs):.0f}s")
+        return True
+
+    # split the cores between the jobs so N concurrent cargo builds do not oversubscribe the machine
+    cargo_jobs = args.cargo_jobs if args.cargo_jobs else max(1, (os.cpu_count() or 1) // jobs)
+    if args.isolate:
+        # a pinned cargo gets as many jobs as its slice has cpus
+        slice_cpus = setup_isolation(args, jobs)
+        cargo_jobs = args.cargo_jobs if args.cargo_jobs else slice_cpus
+    os.environ["CARGO_BUILD_JOBS"] = str(cargo_jobs)
+    apply_git_rewrites(args.git_rewrite)
+    logging.info(f"Build with {jobs} jobs, CARGO_BUILD_JOBS={cargo_jobs}")
+
+    args.metrics = None
+    stop_metrics = None
+    if args.metrics_port is not None or args.metrics_textfile:
+        args.metrics = PipelineMetrics(len(target_df))
+        stop_metrics = start_metrics_exporter(args.metrics, args)
+
+    peaks = predict_peak_rss(target_df)
+    reserve_kb = args.mem_reserve * 1024
     all_success = True
-    for row in target_df.itertuples():
-        logging.debug(f"Row: {row}")
-        logging.info("Building crate: {}".format(row.name))
-        index = row.Index
-        name = row.name
-        repository = row.repository
-        dirname = row.dirname
-        
-        if args.analysis_only:
-            ret_analysis, *analysis_time = analyze_crate(dirname)
-            if not ret_analysis:
+    held_time = 0.0
+    # future -> (dirname, predicted peak rss), crates are only submitted once they fit in memory
+    running = {}
+    def reap(finished):
+        nonlocal all_success
+        for future in finished:
+            running.pop(future)
+            if not future.result():
                 all_success = False
-                logging.error(f"Analyze {name} failed")
+    # graphs are rendered off the build path, the render pool drains while the next crates build
+    render_pool = ThreadPoolExecutor(max_workers=max(1, args.render_workers), thread_name_prefix="render")
+    args.render_pool = render_pool
+    args.render_futures = []
+    with render_pool, ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="build") as pool:
+        try:
+            for row, cost, peak in zip(target_df.itertuples(), costs, peaks):
+                held_since = None
+                while running:
+                    headroom = mem_headroom_kb(running)
+                    if len(running) < jobs and headroom - peak >= reserve_kb:
+                        break
+                    if len(running) < jobs and held_since is None:
+                        held_since = time.perf_counter()
+                        logging.info(f"Hold {row.name}: predicted peak {peak / 1024**2:.1f}GB, "
+                                     f"headroom {headroom / 1024**2:.1f}GB, reserve {args.mem_reserve / 1024:.1f}GB")
+                    finished, _ = wait(running, timeout=MEM_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                    reap(finished)
+                if held_since is not None:
+                    held_time += time.perf_counter() - held_since
+                if mem_available_kb() - peak < reserve_kb:
+                    logging.warning(f"{row.name} predicted peak {peak / 1024**2:.1f}GB does not fit, building it alone")
+                running[pool.submit(build_job, row, args, cost)] = (row.dirname, peak)
+            reap(running.copy())
+            render_start = time.perf_counter()
+            rendered_ok = sum(future.result() for future in args.render_futures)
+        except KeyboardInterrupt:
+            # the children lead their own process groups, the terminal's SIGINT never reached them
+            interrupt_build([pool, render_pool], list(running) + args.render_futures)
+            teardown_isolation(args)
+            if stop_metrics:
+                stop_metrics()
+            raise
+    teardown_isolation(args)
+    if stop_metrics:
+        stop_metrics()
+    logging.info(f"Rendered {rendered_ok}/{len(args.render_futures)} crates, "
+                 f"{time.perf_counter() - render_start:.0f}s spent waiting for the render pool after the last build")
+    if held_time > 0:
+        logging.info(f"Memory admission held crates back for {held_time:.0f}s")
+    built = load_crates()
+    built = built[built["name"].isin(target_df["name"])]
+    logging.info(f"Checkpoints saved {built['resume_saved_s'].sum():.0f}s of already finished stages")
+    if args.vendor_store and not args.analysis_only:
+        logging.info(f"Vendor store saved {built['vendor_bytes_reused'].sum() / 1e9:.2f}GB and "
+                     f"~{built['vendor_saved_s'].sum():.0f}s over per-crate vendoring")
+    export_results("crates.csv")
+    return all_success
+    
+def index_crates(args: argparse.Namespace) -> bool:
+    # rebuilds the index from the checkouts already on disk, without running any build stage
+    df = load_crates().iloc[args.skip:args.skip+args.limit]
+    df = df[df["valid_proj"] == True]
+    conn = db_connect()
+    try:
+        for row in df.itertuples():
+            if not os.path.isdir(crate_path(row.dirname, "target", "entry_points")):
+                logging.info(f"Index {row.name} skipped, no entry points on disk")
                 continue
-            cp_result(dirname)
-            ffi_checker_analysis_time_str = f"real_time:{analysis_time[0]:.2f}s, user_time:{analysis_time[1]:.2f}s, sys_time:{analysis_time[2]:.2f}s"
-            df.loc[index, "ffi_checker_analysis_time"] = ffi_checker_analysis_time_str
-            render_graph(dirname)
-            df.to_csv("crates.csv", index=False)
-            continue
-            
-        ret_clone, *clone_time = clone_crate(repository, dirname)
-        if not ret_clone:
-            all_success = False
-            logging.error(f"Clone {name} failed")
-            continue
-        ret_submodule, *submodule_time = init_submodule(dirname)
-        if not ret_submodule:
-            all_success = False
-            logging.error(f"Init submodule {name} failed")
+            entries = index_ffi_entries(row.dirname)
+            db_replace_ffi_index(conn, row.name, entries)
+            db_update_crate(conn, row.name, {"ffi_symbols": len({symbol for symbol, _ in entries})})
+            logging.info(f"Index {row.name}: {len(entries)} entries")
+    finally:
+        conn.close()
+    return True
+
+def graph_stats(dirname: str) -> dict:
+    stats = {}
+    for file, prefix in GRAPH_FILES.items():
+        path = result_path(dirname, file)
+        if not os.path.exists(path):
             continue
-        ret_override = override_toolchain(dirname)
+        graph = parse_dot(path)
+        stats[f"{prefix}_nodes"] = graph.n_nodes
+        stats[f"{prefix}_edges"] = graph.n_edges
+        stats[f"{prefix}_red_nodes"] = int(graph.red.sum())
+        stats[f"{prefix}_clusters"] = len(graph.cluster_names)
+    return stats
 
-        # download deps
-        ret_clean = cargo_clean(dirname)
-        ret_build, *build_time = build_crate(dirname)
+TIME_METRICS = ["real_s", "user_s", "sys_s"]
+COSTLY_FACTOR = 2
 
-        if not (ret_clone and ret_submodule and ret_override and ret_clean and ret_build):
-            all_success = False
-            logging.error(f"Build {name} failed")
-            crate_dir = os.path.join(os.getcwd(), "proj_collect", dirname)
-            shutil.rmtree(crate_dir, ignore_errors=True)
-            continue
+def stage_times(df: pd.DataFrame, stage: str) -> np.ndarray:
+    # (n, 3) float array of real/user/sys seconds for one measured stage
+    return df[[f"{stage}_{metric}" for metric in TIME_METRICS]].to_numpy(dtype=np.float64)
+
+INTERFACE_METRICS = "interface_metrics"
+INTERFACE_FFI = "interface_ffi"
 
-        normal_build_time_str = f"real_time:{build_time[0]:.2f}s, user_time:{build_time[1]:.2f}s, sys_time:{build_time[2]:.2f}s"
+def write_table(df: pd.DataFrame, stem: str) -> str:
+    # parquet when pyarrow or fastparquet is there, csv otherwise
+    try:
+        path = stem + ".parquet"
+        df.to_parquet(path + ".tmp", index=False)
+    except ImportError:
+        path = stem + ".csv"
+        df.to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return path
 
-        ret_clean = cargo_clean(dirname)
-        ret_gen_ir, *ffi_checker_build_time_info = gen_crate_ir(dirname)
+def read_table(stem: str) -> pd.DataFrame:
+    if os.path.exists(stem + ".parquet"):
+        try:
+            return pd.read_parquet(stem + ".parquet")
+        except ImportError:
+            pass
+    if os.path.exists(stem + ".csv"):
+        return pd.read_csv(stem + ".csv")
+    return None
 
-        ffi_checker_build_time_str = f"real_time:{ffi_checker_build_time_info[0]:.2f}s, user_time:{ffi_checker_build_time_info[1]:.2f}s, sys_time:{ffi_checker_build_time_info[2]:.2f}s"
+def parse_interface(path: str, known_sha: str = None) -> tuple[str, dict]:
+    # runs in the worker processes, returns only the sha when the content did not change
+    with open(path, "rb") as f:
+        data = f.read()
+    sha = hashlib.sha256(data).hexdigest()
+    if sha == known_sha:
+        return sha, None
+    interface_info = json.loads(data)
+    # width: call stacks reaching an FFI function, depth: the longest of them
+    return sha, {
+        "ffi_name": [ffi_info["ffi_name"] for ffi_info in interface_info],
+        "ffi_width": [len(ffi_info["call_stack"]) for ffi_info in interface_info],
+        "ffi_depth": [max((len(stack) for stack in ffi_info["call_stack"]), default=0) for ffi_info in interface_info],
+    }
 
-        if not ret_gen_ir or not ret_clean:
-            all_success = False
-            logging.error(f"Generate IR for {name} failed")
-            crate_dir = os.path.join(os.getcwd(), "proj_collect", dirname)
-            shutil.rmtree(crate_dir, ignore_errors=True)
+def extract_interface_metrics(root: str = "result_collect", workers: int = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # (per crate, per FFI) metrics of every <root>/<dirname>/interface.json, only changed files are parsed again
+    cached = read_table(INTERFACE_METRICS)
+    cached_ffi = read_table(INTERFACE_FFI)
+    if cached is None or cached_ffi is None:
+        cached = pd.DataFrame(columns=["dirname", "mtime_ns", "size", "sha256"])
+        cached_ffi = pd.DataFrame(columns=["dirname", "ffi_name", "ffi_width", "ffi_depth"])
+    cached = cached.set_index("dirname")
+    files = {}
+    for entry in os.scandir(root) if os.path.isdir(root) else []:
+        path = os.path.join(entry.path, "interface.json")
+        try:
+            st = os.stat(path)
+        except OSError:
             continue
+        files[entry.name] = (path, st.st_mtime_ns, st.st_size)
 
-        ret_valid = check_valid(dirname)
+    unchanged = {
+        dirname for dirname, (_, mtime_ns, size) in files.items()
+        if dirname in cached.index and cached.at[dirname, "mtime_ns"] == mtime_ns and cached.at[dirname, "size"] == size
+    }
+    stale = [dirname for dirname in files if dirname not in unchanged]
+    known_sha = [cached.at[dirname, "sha256"] if dirname in cached.index else None for dirname in stale]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parsed = list(pool.map(parse_interface, [files[dirname][0] for dirname in stale], known_sha, chunksize=8))
+
+    # a touched file with the same content keeps its rows, only its mtime is refreshed
+    reparsed = {dirname: metrics for dirname, (_, metrics) in zip(stale, parsed) if metrics is not None}
+    keep = set(files) - set(reparsed)
+    ffi_frames = [cached_ffi[cached_ffi["dirname"].isin(keep)]] + [
+        pd.DataFrame({"dirname": dirname, **metrics}) for dirname, metrics in reparsed.items()
+    ]
+    ffi_df = pd.concat(ffi_frames, ignore_index=True).astype({"ffi_width": "int64", "ffi_depth": "int64"})
+    sha = {dirname: cached.at[dirname, "sha256"] for dirname in unchanged}
+    sha.update({dirname: digest for dirname, (digest, _) in zip(stale, parsed)})
+
+    grouped = ffi_df.assign(ffi_used=ffi_df["ffi_depth"] != 0).groupby("dirname")
+    crate_df = pd.DataFrame({
+        "dirname": list(files),
+        "mtime_ns": [files[dirname][1] for dirname in files],
+        "size": [files[dirname][2] for dirname in files],
+        "sha256": [sha[dirname] for dirname in files],
+    }).set_index("dirname")
+    crate_df["ffi_count"] = grouped.size()
+    crate_df["ffi_width_mean"] = grouped["ffi_width"].mean()
+    crate_df["ffi_depth_mean"] = grouped["ffi_depth"].mean()
+    crate_df["ffi_usage_rate"] = grouped["ffi_used"].mean()
+    crate_df["ffi_count"] = crate_df["ffi_count"].fillna(0).astype("int64")
+    crate_df = crate_df.reset_index()
+    if reparsed or len(unchanged) != len(files) or len(cached) != len(files):
+        write_table(crate_df, INTERFACE_METRICS)
+        write_table(ffi_df, INTERFACE_FFI)
+    logging.info(f"Interface metrics of {len(files)} crates: {len(reparsed)} parsed, "
+                 f"{len(files) - len(reparsed)} from the cache")
+    return crate_df, ffi_df
+
+def describe(values: np.ndarray) -> str:
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return "no data"
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return (f"n={len(values)} mean={values.mean():.2f}% p50={p50:.2f}% p90={p90:.2f}% "
+            f"p99={p99:.2f}% max={values.max():.2f}%")
+
+def report_metrics(df: pd.DataFrame) -> dict:
+    valid_df = df[df["valid_proj"]]
+    normal_build_times = stage_times(valid_df, "normal_build")
+    ffi_checker_build_times = stage_times(valid_df, "ffi_checker_build")
+    ffi_analyzer_times = stage_times(valid_df, "ffi_checker_analysis")
+    build_time_sum = np.nansum(normal_build_times, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics = {
+            "build_success": int(df["build_success"].sum()),
+            "ffi_checker_success": int(df["ffi_checker_success"].sum()),
+            "valid_proj": int(df["valid_proj"].sum()),
+            # aggregate overhead over the whole corpus, per real/user/sys
+            "checker_overhead": (np.nansum(ffi_checker_build_times, axis=0) - build_time_sum) / build_time_sum * 100,
+            "analyzer_overhead": np.nansum(ffi_analyzer_times, axis=0) / build_time_sum * 100,
+            # per crate distributions, (n, 3) each
+            "checker_crate_overhead": (ffi_checker_build_times - normal_build_times) / normal_build_times * 100,
+            "analyzer_crate_overhead": ffi_analyzer_times / normal_build_times * 100,
+        }
+    metrics["valid_ratio"] = metrics["valid_proj"] * 100 / metrics["build_success"] if metrics["build_success"] else np.nan
+    # with --trials a crate is costly only if the whole confidence interval of its ratio is above the factor
+    single = valid_df["normal_build_real_s"] * COSTLY_FACTOR < valid_df["ffi_checker_build_real_s"]
+    costly = (valid_df["ffi_checker_ratio_ci_low"] > COSTLY_FACTOR).where(valid_df["ffi_checker_ratio_ci_low"].notna(), single)
+    metrics["costly"] = valid_df.loc[costly.astype(bool), [
+        "name", "normal_build_real_s", "ffi_checker_build_real_s", "ffi_checker_analysis_real_s",
+        "trials", "ffi_checker_ratio_median", "ffi_checker_ratio_ci_low", "ffi_checker_ratio_ci_high",
+    ]]
+    trial_df = valid_df[valid_df["trials"] > 1]
+    metrics["trial_crates"] = len(trial_df)
+    if len(trial_df):
+        # corpus overhead from the per crate medians, the interval from the per crate interval bounds
+        normal = trial_df["normal_build_real_s_median"].sum()
+        metrics["checker_trial_overhead"] = np.array([
+            (trial_df[f"ffi_checker_build_real_s_{stat}"].sum() - trial_df[f"normal_build_real_s_{other}"].sum()) / normal * 100
+            for stat, other in [("median", "median"), ("ci_low", "ci_high"), ("ci_high", "ci_low")]
+        ])
+    return metrics
+
+def report_figures(metrics: dict, interface_df: pd.DataFrame, figure_dir: str, formats: list):
+    # headless, matplotlib is only needed when figures are asked for
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    os.makedirs(figure_dir, exist_ok=True)
+
+    def save(figure, name: str, **kwargs):
+        for fmt in formats:
+            figure.savefig(os.path.join(figure_dir, f"{name}.{fmt}"), format=fmt, dpi=300, **kwargs)
+        plt.close(figure)
+
+    figure1, axis_list = plt.subplots(3, 2)
+    figure1.set_size_inches(10, 8)
+    for column, data in enumerate([metrics["checker_crate_overhead"] / 100, metrics["analyzer_crate_overhead"] / 100]):
+        for row, title in enumerate(["Real", "User", "System"]):
+            values = data[:, row]
+            axis_list[row][column].hist(values[np.isfinite(values)], bins=20)
+            axis_list[row][column].set_title(f"{title} time additional time cost distribution diagram")
+    figure1.tight_layout(h_pad=2, w_pad=1)
+    save(figure1, "figure1", bbox_inches="tight")
+
+    figure2, axis = plt.subplots(1, 1)
+    axis.hist(metrics["costly"]["normal_build_real_s"].dropna(), bins=20)
+    axis.set_title("Costly crate build time distribution diagram")
+    axis.set_xlabel("Second")
+    axis.set_ylabel("Count")
+    save(figure2, "figure2")
+
+    if interface_df is not None and len(interface_df):
+        figure3, axis3_list = plt.subplots(1, 3)
+        figure3.set_size_inches(15, 5)
+        for axis, (column, title) in zip(axis3_list, [("ffi_width_mean", "FFI Width Mean"), ("ffi_depth_mean", "FFI Depth Mean"), ("ffi_usage_rate", "FFI Usage Rate")]):
+            axis.hist(interface_df[column].dropna(), bins=20)
+            axis.set_title(title)
+        figure3.tight_layout(h_pad=2, w_pad=1)
+        save(figure3, "figure3", bbox_inches="tight")
+
+def report(args: argparse.Namespace) -> bool:
+    start = time.perf_counter()
+    df = load_crates()
+    metrics = report_metrics(df)
+    elapsed = time.perf_counter() - start
+    checker, analyzer = metrics["checker_overhead"], metrics["analyzer_overhead"]
+    print(f"使用`rustc 1.78.0-nightly (8ace7ea1f 2024-02-07)`成功构建的crate有{metrics['build_success']}个")
+    print(f"使用FFI Checker 成功生成IR的有{metrics['ffi_checker_success']}个")
+    print(f"使用 FFI Analyzer 得发现使用到FFI函数的crate有{metrics['valid_proj']}个, 占成功构建的{metrics['valid_ratio']:.2f}%")
+    print(f"使用FFI Checker功能额外带来的编译时间开销为: real_time: {checker[0]:.2f}%, user_time: {checker[1]:.2f}%, sys_time: {checker[2]:.2f}%")
+    print(f"使用FFI Analyzer 功能额外带来的编译时间开销为: real_time: {analyzer[0]:.2f}%, user_time: {analyzer[1]:.2f}%, sys_time: {analyzer[2]:.2f}%")
+    for name, key in [("FFI Checker", "checker_crate_overhead"), ("FFI Analyzer", "analyzer_crate_overhead")]:
+        for index, metric in enumerate(TIME_METRICS):
+            print(f"{name} per crate {metric} overhead: {describe(metrics[key][:, index])}")
+    if metrics["trial_crates"]:
+        median, low, high = metrics["checker_trial_overhead"]
+        print(f"重复测量的{metrics['trial_crates']}个crate中, FFI Checker 的 real_time 开销中位数为 {median:.2f}% "
+              f"(置信区间 [{low:.2f}%, {high:.2f}%])")
+    costly = metrics["costly"]
+    print(f"FFI Checker 构建时间超过 {COSTLY_FACTOR} 倍的crate有{len(costly)}个")
+    if len(costly):
+        print(costly.to_string(index=False))
+    logging.info(f"Report metrics of {len(df)} crates in {elapsed * 1000:.1f}ms")
+
+    if args.figures:
+        interface_df = None
+        if args.interface:
+            interface_df, _ = extract_interface_metrics()
+            interface_df = interface_df[interface_df["dirname"].isin(df.loc[df["valid_proj"], "dirname"])]
+        start = time.perf_counter()
+        try:
+            report_figures(metrics, interface_df, args.figures, args.formats)
+        except ImportError as e:
+            logging.error(f"Figures need matplotlib: {e}")
+            return False
+        logging.info(f"Report figures written to {args.figures} in {time.perf_counter() - start:.2f}s")
+    return True
+
+def extract_metrics(args: argparse.Namespace) -> bool:
+    start = time.perf_counter()
+    crate_df, ffi_df = extract_interface_metrics(args.root, args.workers)
+    logging.info(f"Extract metrics of {len(crate_df)} crates, {len(ffi_df)} FFI functions in {time.perf_counter() - start:.2f}s")
+    print(crate_df[["dirname", "ffi_count", "ffi_width_mean", "ffi_depth_mean", "ffi_usage_rate"]].describe().to_string())
+    return True
+
+def render(args: argparse.Namespace) -> bool:
+    df = load_crates().iloc[args.skip:args.skip+args.limit]
+    df = df[[os.path.isdir(result_path(dirname)) for dirname in df["dirname"]]]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="render") as pool:
+        results = list(pool.map(lambda row: render_job(row, args), df.itertuples()))
+    elapsed = time.perf_counter() - start
+    rendered_df = load_crates()
+    rendered_df = rendered_df[rendered_df["name"].isin(df["name"])]
+    logging.info(f"Rendered {sum(results)}/{len(df)} crates in {elapsed:.2f}s, "
+                 f"{rendered_df['render_cached'].sum():.0f} graphs from the render cache, "
+                 f"{rendered_df['render_real_s'].sum():.2f}s of per-file render time")
+    return all(results)
+
+def graphs(args: argparse.Namespace) -> bool:
+    df = load_crates().iloc[args.skip:args.skip+args.limit]
+    df = df[[os.path.isdir(result_path(dirname)) for dirname in df["dirname"]]]
+    total_bytes = sum(
+        os.path.getsize(result_path(dirname, file))
+        for dirname in df["dirname"] for file in GRAPH_FILES
+        if os.path.exists(result_path(dirname, file))
+    )
+    start = time.perf_counter()
+    conn = db_connect()
+    try:
+        # parsing is pure python, spread the crates over processes
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for name, stats in zip(df["name"], pool.map(graph_stats, df["dirname"], chunksize=4)):
+                db_update_crate(conn, name, stats)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    logging.info(f"Parsed the graphs of {len(df)} crates, {total_bytes / 1e6:.1f}MB in {elapsed:.2f}s "
+                 f"({total_bytes / 1e6 / max(elapsed, 1e-9):.1f}MB/s)")
+    return True
+
+def query_ffi(args: argparse.Namespace) -> bool:
+    conn = db_connect()
+    try:
+        for symbol in args.symbols:
+            # shell style wildcards, e.g. sqlite3_*
+            op = "GLOB" if any(c in symbol for c in "*?[") else "="
+            rows = conn.execute(
+                f"SELECT crate, COUNT(DISTINCT symbol), GROUP_CONCAT(DISTINCT entry_file) FROM ffi_index "
+                f"WHERE symbol {op} ? GROUP BY crate ORDER BY crate", (symbol,)
+            ).fetchall()
+            print(f"{symbol}: {len(rows)} crates")
+            for crate, symbols, entry_files in rows:
+                print(f"  {crate}\t{symbols} symbols\t{entry_files if args.files else ''}".rstrip())
+    finally:
+        conn.close()
+    return True
 
-        if ret_valid:
-            ret_analysis, *analysis_time = analyze_crate(dirname)
-            if not ret_analysis:
-                all_success = False
-                logging.error(f"Analyze {name} failed")
-                continue
-            cp_result(dirname)
-            ffi_checker_analysis_time_str = f"real_time:{analysis_time[0]:.2f}s, user_time:{analysis_time[1]:.2f}s, sys_time:{analysis_time[2]:.2f}s"
-            df.loc[index, "ffi_checker_analysis_time"] = ffi_checker_analysis_time_str
-            render_graph(dirname)
-        else:
-            crate_dir = os.path.join(os.getcwd(), "proj_collect", dirname)
-            shutil.rmtree(crate_dir, ignore_errors=True)
-        
-        logging.debug(f"Build {name}\tIndex:{index}\tresult:{ret_build}")
-        df.loc[index, "build_success"] = ret_build
-        df.loc[index, "valid_proj"] = ret_valid
-        df.loc[index, "ffi_checker_success"] = ret_gen_ir
-        df.loc[index, "ffi_checker_build_time"] = ffi_checker_build_time_str
-        df.loc[index, "normal_build_time"] = normal_build_time_str
-
-        # save data each time
-        df.to_csv("crates.csv", index=False)
-    
 @time_profiler
 def clean(args: argparse.Namespace) -> bool:
     if args.skip is not None and args.limit is not None:
-        df = pd.read_csv("crates.csv")
+        df = load_crates()
         skip_cnt = args.skip
         limit = args.limit
         df = df.iloc[skip_cnt:skip_cnt+limit]
@@ -479,12 +2964,18 @@ def clean(args: argparse.Namespace) -> bool:
                 logging.info(f"Clean {dirname} success")
             else:
                 logging.info(f"Clean {dirname} failed, directory does not exist")
+            if os.path.exists(state_path(dirname)):
+                os.remove(state_path(dirname))
     elif args.skip is None and args.limit is None:
         if os.path.exists("crates.csv"):
             os.remove('crates.csv')
             logging.info('file deleted')
         else:
             logging.info("File does not exists")
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.exists(RESULTS_DB + suffix):
+                os.remove(RESULTS_DB + suffix)
+                logging.info(f'{RESULTS_DB + suffix} deleted')
         if os.path.exists("proj_collect"):
             shutil.rmtree("proj_collect", ignore_errors=True)
             logging.info('proj_collect directory deleted')
@@ -507,6 +2998,7 @@ def main():
     logging.basicConfig(
         filename='new.log',
         filemode='w',
+        format='%(asctime)s %(threadName)s %(levelname)s: %(message)s',
         level=logging.DEBUG
     )
     parser = argparse.ArgumentParser(
@@ -517,18 +3009,104 @@ def main():
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     init_parser = subparsers.add_parser("init", help="Initialize the crates list")
+    init_parser.add_argument("--base-url", type=str, default=BASE_URL, help="crates.io API base url")
+    init_parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS, help="Concurrent catalogue page requests")
+    init_parser.add_argument("--rate", type=float, default=FETCH_RATE, help="Max catalogue requests per second")
+    init_parser.add_argument("--cache-dir", type=str, default=HTTP_CACHE_DIR, help="On-disk crates.io response cache")
+    init_parser.add_argument("--cache-ttl", type=float, default=HTTP_CACHE_TTL, help="Seconds a cached response is used without revalidation")
+    init_parser.add_argument("--cache-max-mb", type=int, default=HTTP_CACHE_MAX_BYTES // (1024 * 1024), help="Size bound of the response cache")
+    init_parser.add_argument("--no-cache", action="store_true", help="Do not use the response cache")
+    init_parser.add_argument("--offline", action="store_true", help="Serve every request from the response cache")
+    init_parser.add_argument("--refresh", action="store_true", help="Merge the current catalogue into the existing results instead of starting over")
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="Record the crates.io catalogue and mirror the repositories for offline runs")
+    snapshot_parser.add_argument("--output", type=str, default=SNAPSHOT_DIR, help="Snapshot directory")
+    snapshot_parser.add_argument("--base-url", type=str, default=BASE_URL, help="crates.io API base url")
+    snapshot_parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS, help="Concurrent catalogue page requests")
+    snapshot_parser.add_argument("--rate", type=float, default=FETCH_RATE, help="Max catalogue requests per second")
+    snapshot_parser.add_argument("--skip", type=int, default=0, help="Skip the first n repositories")
+    snapshot_parser.add_argument("--limit", type=int, default=None, help="Limit the number of repositories to mirror, default all")
+    snapshot_parser.add_argument("--workers", type=int, default=4, help="Concurrent repository mirrors")
+
+    serve_parser = subparsers.add_parser("serve", help="Serve a snapshot as a local crates.io API and git host")
+    serve_parser.add_argument("--snapshot", type=str, default=SNAPSHOT_DIR, help="Snapshot directory")
+    serve_parser.add_argument("--host", type=str, default="127.0.0.1", help="Listen address")
+    serve_parser.add_argument("--port", type=int, default=8000, help="Listen port, 0 for any free port")
 
     build_parser = subparsers.add_parser("build", help="Rebuild all crates in the crates list")
     build_parser.add_argument("--skip", type=int, default=0, help="Skip the first n crates")
     build_parser.add_argument("--limit", type=int, default=10, help="Limit the number of crates to build")
     build_parser.add_argument("--valid-only", type=bool, default=False, help="Build only valid crates")
     build_parser.add_argument("--analysis-only", type=bool, default=False, help="Only analysis crates")
+    build_parser.add_argument("--jobs", "-j", type=int, default=1, help="Number of crates to build concurrently")
+    build_parser.add_argument("--mirror-dir", type=str, default=GIT_MIRROR_DIR, help="Shared bare git mirrors, empty string to disable")
+    build_parser.add_argument("--shallow", action="store_true", help="Clone crates and submodules with --depth 1, without the shared mirrors")
+    build_parser.add_argument("--partial", action="store_true", help="Blobless clones with --filter=blob:none")
+    build_parser.add_argument("--vendor-store", type=str, default=VENDOR_STORE_DIR, help="Shared dependency source store, empty string for per-crate cargo vendor")
+    build_parser.add_argument("--adaptive-timeout", action=argparse.BooleanOptionalAction, default=True, help="Predict stage timeouts from previous results")
+    build_parser.add_argument("--timeout-factor", type=float, default=TIMEOUT_FACTOR, help="Safety factor on the previous stage duration")
+    build_parser.add_argument("--timeout-floor", type=float, default=TIMEOUT_FLOOR, help="Minimum predicted stage timeout in seconds")
+    build_parser.add_argument("--order", choices=["cost", "row"], default="cost", help="Queue crates by predicted cost, longest first, or in crates list order")
+    build_parser.add_argument("--dry-run", action="store_true", help="Print the queue and its predicted makespan without building")
+    build_parser.add_argument("--mem-reserve", type=int, default=MEM_RESERVE_MB, help="MB of available memory kept free when admitting a crate")
+    build_parser.add_argument("--index-ffi", action=argparse.BooleanOptionalAction, default=True, help="Record every FFI symbol of valid crates in the ffi_index table")
+    build_parser.add_argument("--render-max-nodes", type=int, default=RENDER_MAX_NODES, help="Reduce graphs with more nodes before rendering")
+    build_parser.add_argument("--render-max-edges", type=int, default=RENDER_MAX_EDGES, help="Reduce graphs with more edges before rendering")
+    build_parser.add_argument("--render-workers", type=int, default=RENDER_WORKERS, help="Concurrent dot renders")
+    build_parser.add_argument("--render-format", type=str, default=RENDER_FORMAT, help="dot output format")
+    build_parser.add_argument("--render-cache", type=str, default=RENDER_CACHE_DIR, help="Renders cached by dot source sha and format")
+    build_parser.add_argument("--git-rewrite", action="append", default=[], metavar="FROM=TO", help="Fetch git urls starting with FROM from TO instead, repeatable")
+    build_parser.add_argument("--trials", type=int, default=1, help="Repeat the clean normal and checker builds n times and store median, MAD and confidence interval")
+    build_parser.add_argument("--warmup", type=int, default=1, help="Discarded trial pairs before the measured ones")
+    build_parser.add_argument("--alternate", action=argparse.BooleanOptionalAction, default=True, help="Alternate which of the two builds runs first in each trial")
+    build_parser.add_argument("--isolate", action="store_true", help="Pin the measured stages to a dedicated cpu slice, inside a cgroup v2 leaf where one can be created")
+    build_parser.add_argument("--cpus-per-job", type=int, default=None, help="Cpus in each slice with --isolate, default cpu count // jobs")
+    build_parser.add_argument("--metrics-port", type=int, default=None, help="Serve live prometheus metrics on this port at /metrics")
+    build_parser.add_argument("--metrics-host", type=str, default="127.0.0.1", help="Listen address of the metrics endpoint")
+    build_parser.add_argument("--metrics-textfile", type=str, default=None, help="Also write the metrics to this file for node_exporter's textfile collector")
+    build_parser.add_argument("--cargo-jobs", type=int, default=None, help="CARGO_BUILD_JOBS per crate, default cpu_count // jobs")
 
     analysis_parser = subparsers.add_parser("analysis", help="Analyze the crates list")
     analysis_parser.add_argument("--skip", type=int, default=0, help="Skip the first n crates")
     analysis_parser.add_argument("--limit", type=int, default=10, help="Limit the number of crates to analyze")
     analysis_parser.add_argument("--output", type=str, default="result_collect", help="Output directory for the analysis results")
 
+    migrate_parser = subparsers.add_parser("migrate", help="Convert legacy time string columns to numeric columns")
+    migrate_parser.add_argument("files", nargs="*", default=["crates.csv"], help="CSV files to migrate in place")
+
+    export_parser = subparsers.add_parser("export", help="Export the results store to CSV or Parquet")
+    export_parser.add_argument("--output", type=str, default="crates.csv", help="Output file, .parquet for Parquet")
+
+    index_parser = subparsers.add_parser("index", help="Rebuild the FFI symbol index from the built crates on disk")
+    index_parser.add_argument("--skip", type=int, default=0, help="Skip the first n crates")
+    index_parser.add_argument("--limit", type=int, default=10, help="Limit the number of crates to index")
+
+    report_parser = subparsers.add_parser("report", help="Compute the evaluation metrics and figures from the results store")
+    report_parser.add_argument("--figures", type=str, default="figures", help="Figure directory, empty string for metrics only")
+    report_parser.add_argument("--formats", nargs="+", default=["svg", "eps"], help="Figure formats")
+    report_parser.add_argument("--interface", action=argparse.BooleanOptionalAction, default=True, help="Use the interface.json metrics of valid crates for figure3")
+
+    metrics_parser = subparsers.add_parser("metrics", help="Extract the FFI width, depth and usage metrics from every interface.json")
+    metrics_parser.add_argument("--root", type=str, default="result_collect", help="Directory with one result directory per crate")
+    metrics_parser.add_argument("--workers", type=int, default=None, help="Parser processes, default cpu count")
+
+    render_parser = subparsers.add_parser("render", help="Render the collected graphs in parallel")
+    render_parser.add_argument("--skip", type=int, default=0, help="Skip the first n crates")
+    render_parser.add_argument("--limit", type=int, default=10, help="Limit the number of crates to render")
+    render_parser.add_argument("--workers", type=int, default=RENDER_WORKERS, help="Concurrent dot renders")
+    render_parser.add_argument("--render-format", type=str, default=RENDER_FORMAT, help="dot output format")
+    render_parser.add_argument("--render-cache", type=str, default=RENDER_CACHE_DIR, help="Renders cached by dot source sha and format")
+    render_parser.add_argument("--force", action="store_true", help="Render again even if the cache has the graph")
+
+    graphs_parser = subparsers.add_parser("graphs", help="Parse the collected call and control flow graphs and record their sizes")
+    graphs_parser.add_argument("--skip", type=int, default=0, help="Skip the first n crates")
+    graphs_parser.add_argument("--limit", type=int, default=10, help="Limit the number of crates to parse")
+    graphs_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Parser processes")
+
+    query_parser = subparsers.add_parser("query", help="List the crates calling an FFI symbol")
+    query_parser.add_argument("symbols", nargs="+", help="FFI symbols, * and ? wildcards allowed")
+    query_parser.add_argument("--files", action="store_true", help="Also print the entry point files")
+
     clean_parser =subparsers.add_parser("clean", help="Clean the crates target directory")
     clean_parser.add_argument("--skip", type=int, help="Skip the first n crates")
     clean_parser.add_argument("--limit", type=int, help="Limit the number of crates to clean")
@@ -538,10 +3116,41 @@ def main():
     
     if args.command == "init":
         logging.info("Init")
-        init()
+        init(args)
+    elif args.command == "snapshot":
+        logging.info("Snapshot")
+        snapshot(args)
+    elif args.command == "serve":
+        logging.info("Serve")
+        serve(args)
     elif args.command == "build":
         logging.info("Build")
         build(args)
+    elif args.command == "migrate":
+        logging.info("Migrate")
+        migrate(args)
+    elif args.command == "export":
+        logging.info("Export")
+        load_crates()
+        export_results(args.output)
+    elif args.command == "index":
+        logging.info("Index")
+        index_crates(args)
+    elif args.command == "report":
+        logging.info("Report")
+        report(args)
+    elif args.command == "metrics":
+        logging.info("Metrics")
+        extract_metrics(args)
+    elif args.command == "render":
+        logging.info("Render")
+        render(args)
+    elif args.command == "graphs":
+        logging.info("Graphs")
+        graphs(args)
+    elif args.command == "query":
+        logging.info("Query")
+        query_ffi(args)
     elif args.command == "clean":
         logging.info("Clean")
         clean(args)
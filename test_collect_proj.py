@@ -0,0 +1,178 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+import collect_proj
+
+# a build worker thread running a long command, interrupted the way build() handles ctrl-c
+INTERRUPT_SCRIPT = textwrap.dedent("""
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+    sys.path.insert(0, sys.argv[1])
+    import collect_proj
+    pidfile = sys.argv[2]
+    pool = ThreadPoolExecutor(max_workers=1)
+    future = pool.submit(collect_proj.run_cmd, ["sh", "-c", f"echo $$ > {pidfile}; exec sleep 30"])
+    try:
+        future.result()
+    except KeyboardInterrupt:
+        collect_proj.interrupt_build([pool], [future])
+        sys.exit(130)
+""")
+
+def pid_alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # a killed child not reaped yet is a zombie
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return False
+
+class InterruptTest(unittest.TestCase):
+    def test_sigint_kills_threaded_run_cmd(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pidfile = os.path.join(tmp, "pid")
+            proc = subprocess.Popen([sys.executable, "-c", INTERRUPT_SCRIPT, HERE, pidfile], cwd=tmp)
+            deadline = time.time() + 10
+            while not os.path.exists(pidfile) or not open(pidfile).read().strip():
+                self.assertLess(time.time(), deadline, "command never started")
+                time.sleep(0.05)
+            child = int(open(pidfile).read())
+            start = time.time()
+            proc.send_signal(signal.SIGINT)
+            self.assertEqual(proc.wait(timeout=10), 130)
+            self.assertLess(time.time() - start, 5)
+            self.assertFalse(pid_alive(child), "the command survived ctrl-c")
+
+class PeakRssTest(unittest.TestCase):
+    def run_measured(self, cmd: list) -> int:
+        collect_proj._stage_usage.children = []
+        try:
+            collect_proj.run_cmd(cmd)
+            return collect_proj._stage_usage.children[0][1]
+        finally:
+            collect_proj._stage_usage.children = None
+
+    def test_short_command_does_not_report_our_rss(self):
+        self.assertEqual(self.run_measured(["true"]), 0)
+
+    def test_peak_follows_the_group(self):
+        # 200MB held by a grandchild, the direct child is a small shell
+        script = "import time; data = bytearray(200 << 20); time.sleep(1)"
+        with mock.patch.object(collect_proj, "MEM_SAMPLE_INTERVAL", 0.1):
+            peak_kb = self.run_measured(["sh", "-c", f'{sys.executable} -c "{script}"; true'])
+        self.assertGreater(peak_kb, 200 << 10)
+        self.assertLess(peak_kb, 400 << 10)
+
+class StubHandler(BaseHTTPRequestHandler):
+    # path -> responses still to hand out as (status, headers), the last one repeats
+    script = {}
+    requests = []
+
+    def do_GET(self):
+        StubHandler.requests.append((time.monotonic(), self.path, dict(self.headers)))
+        responses = StubHandler.script[self.path]
+        status, headers = responses.pop(0) if len(responses) > 1 else responses[0]
+        body = json.dumps({"path": self.path}).encode() if status == 200 else b""
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class CratesClientTest(unittest.TestCase):
+    def setUp(self):
+        StubHandler.script = {}
+        StubHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tmp = tempfile.TemporaryDirectory()
+        # retries back off in milliseconds instead of seconds
+        patcher = mock.patch.object(collect_proj, "FETCH_BACKOFF", 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def client(self, rate: float = 1000, ttl: float = 3600) -> collect_proj.CratesClient:
+        cache = collect_proj.HttpCache(os.path.join(self.tmp.name, "cache"), ttl=ttl)
+        return collect_proj.CratesClient(self.base_url, rate=rate, cache=cache)
+
+    def test_retries_server_errors_and_rate_limits(self):
+        StubHandler.script["/flaky"] = [(503, {}), (429, {}), (500, {}), (200, {})]
+        client = self.client()
+        self.assertEqual(client.get_json(self.base_url + "/flaky"), {"path": "/flaky"})
+        self.assertEqual(len(StubHandler.requests), 4)
+
+    def test_client_errors_are_not_retried(self):
+        StubHandler.script["/missing"] = [(404, {})]
+        with self.assertRaises(collect_proj.requests.HTTPError):
+            self.client().get_json(self.base_url + "/missing")
+        self.assertEqual(len(StubHandler.requests), 1)
+
+    def test_rate_limit_spaces_requests(self):
+        for index in range(5):
+            StubHandler.script[f"/page{index}"] = [(200, {})]
+        client = self.client(rate=20)
+        for index in range(5):
+            client.get_json(f"{self.base_url}/page{index}")
+        times = [sent for sent, _, _ in StubHandler.requests]
+        self.assertGreaterEqual(times[-1] - times[0], 4 / 20 * 0.9)
+
+    def test_revalidates_stale_entries(self):
+        validators = {"ETag": '"v1"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"}
+        StubHandler.script["/crate"] = [(200, validators), (304, {})]
+        client = self.client(ttl=0)
+        url = self.base_url + "/crate"
+        first = client.get_json(url)
+        self.assertEqual(client.get_json(url), first)
+        headers = StubHandler.requests[1][2]
+        self.assertEqual(headers["If-None-Match"], '"v1"')
+        self.assertEqual(headers["If-Modified-Since"], validators["Last-Modified"])
+        self.assertEqual(client.stats, {"fresh": 0, "revalidated": 1, "downloaded": 1})
+
+    def test_fresh_entries_skip_the_network_until_the_ttl_expires(self):
+        StubHandler.script["/crate"] = [(200, {})]
+        client = self.client(ttl=3600)
+        url = self.base_url + "/crate"
+        client.get_json(url)
+        client.get_json(url)
+        self.assertEqual(len(StubHandler.requests), 1)
+        client.cache.ttl = 0
+        client.get_json(url)
+        self.assertEqual(len(StubHandler.requests), 2)
+        self.assertEqual(client.stats, {"fresh": 1, "revalidated": 0, "downloaded": 2})
+
+    def test_evicts_least_recently_used_entries(self):
+        cache = collect_proj.HttpCache(os.path.join(self.tmp.name, "cache"))
+        urls = [f"{self.base_url}/page{index}" for index in range(3)]
+        for age, url in zip([30, 20, 10], urls):
+            cache.put(url, {"url": url})
+            os.utime(cache.entry_path(url), (time.time() - age, time.time() - age))
+        # reading the oldest entry makes the second one the least recently used
+        cache.get(urls[0])
+        cache.max_bytes = 2 * os.path.getsize(cache.entry_path(urls[0]))
+        cache.evict()
+        self.assertEqual([os.path.exists(cache.entry_path(url)) for url in urls], [True, False, True])
+
+if __name__ == "__main__":
+    unittest.main()